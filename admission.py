@@ -0,0 +1,466 @@
+import itertools
+import json
+import logging
+import math
+import os
+import struct
+import subprocess
+import threading
+import time
+
+# Duration-based admission control for transcription requests
+# Uploads used to be accepted or rejected on byte size, but bytes say little
+# about cost: an hour of Opus can be smaller than 30 s of WAV. Here the real
+# duration is probed from the container header (no decode), turned into a
+# compute cost with the measured real-time factor of the active model, and
+# checked against the instance's budget and queue. Admitted jobs run
+# shortest-first, with ageing so long jobs are not starved.
+
+logger = logging.getLogger(__name__)
+
+# Seconds of compute per second of audio on CPU, used until real runs are measured
+DEFAULT_RTF = {
+    "tiny": 0.15,
+    "base": 0.3,
+    "small": 0.8,
+    "medium": 2.0,
+    "large": 4.0,
+}
+RTF_SMOOTHING = 0.3
+
+# Bytes per second assumed when the duration cannot be probed (~16 kbit/s,
+# low for speech codecs, so unknown files are over- rather than under-estimated)
+FALLBACK_BYTES_PER_SECOND = 2000
+
+# A queued job's priority improves by this many cost-seconds per second waited
+AGING_RATE = 1.0
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job cannot be admitted; carries an HTTP status and Retry-After"""
+
+    def __init__(self, message, status=429, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+# ---------------------------------------------------------------------------
+# Duration probing
+# ---------------------------------------------------------------------------
+
+def _probe_wav(f, size):
+    header = f.read(12)
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    byte_rate = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(chunk_size)
+            byte_rate = struct.unpack("<I", fmt[8:12])[0]
+            continue
+        if chunk_id == b"data" and byte_rate:
+            # Streaming writers leave the size at 0 / 0xFFFFFFFF; use the file size then
+            if chunk_size in (0, 0xFFFFFFFF):
+                chunk_size = size - f.tell()
+            return min(chunk_size, size - f.tell()) / byte_rate
+        f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def _probe_flac(f, size):
+    if f.read(4) != b"fLaC":
+        return None
+    block = f.read(4 + 34)
+    if block[0] & 0x7F != 0:  # STREAMINFO must be the first block
+        return None
+    info = int.from_bytes(block[4 + 10:4 + 18], "big")
+    sample_rate = info >> 44
+    total_samples = info & ((1 << 36) - 1)
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / sample_rate
+
+
+def _probe_ogg(f, size):
+    head = f.read(512)
+    if head[:4] != b"OggS":
+        return None
+    if b"OpusHead" in head:
+        i = head.index(b"OpusHead")
+        pre_skip = struct.unpack("<H", head[i + 10:i + 12])[0]
+        rate = 48000
+    elif b"\x01vorbis" in head:
+        i = head.index(b"\x01vorbis")
+        pre_skip = 0
+        rate = struct.unpack("<I", head[i + 12:i + 16])[0]
+    else:
+        return None
+    # The granule position of the last page is the total sample count
+    f.seek(max(0, size - 65536))
+    tail = f.read()
+    i = tail.rfind(b"OggS")
+    if i < 0 or i + 14 > len(tail):
+        return None
+    granule = struct.unpack("<q", tail[i + 6:i + 14])[0]
+    if granule <= 0 or not rate:
+        return None
+    return max(0, granule - pre_skip) / rate
+
+
+def _probe_mp4(f, size):
+    def boxes(start, end):
+        pos = start
+        while pos + 8 <= end:
+            f.seek(pos)
+            header = f.read(8)
+            box_size, box_type = struct.unpack(">I", header[:4])[0], header[4:8]
+            header_size = 8
+            if box_size == 1:
+                box_size = struct.unpack(">Q", f.read(8))[0]
+                header_size = 16
+            elif box_size == 0:
+                box_size = end - pos
+            if box_size < header_size:
+                return
+            yield box_type, pos + header_size, pos + box_size
+            pos += box_size
+
+    f.seek(4)
+    if f.read(4) != b"ftyp":
+        return None
+    for box_type, body, end in boxes(0, size):
+        if box_type != b"moov":
+            continue
+        for child_type, child_body, _ in boxes(body, end):
+            if child_type != b"mvhd":
+                continue
+            f.seek(child_body)
+            version = f.read(4)[0]
+            if version == 1:
+                f.seek(16, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">IQ", f.read(12))
+            else:
+                f.seek(8, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">II", f.read(8))
+            return duration / timescale if timescale else None
+    return None
+
+
+def _read_vint(data, i):
+    """Read a Matroska variable-length integer; returns (value, next index)"""
+    first = data[i]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8 or i + length > len(data):
+        raise ValueError("bad vint")
+    value = first & (0xFF >> length)
+    for b in data[i + 1:i + length]:
+        value = (value << 8) | b
+    return value, i + length
+
+
+def _probe_webm(f, size):
+    head = f.read(4096)
+    if head[:4] != b"\x1a\x45\xdf\xa3":
+        return None
+    scale = 1000000
+    i = head.find(b"\x2a\xd7\xb1")  # TimecodeScale
+    if i >= 0:
+        length, j = _read_vint(head, i + 3)
+        scale = int.from_bytes(head[j:j + length], "big") or scale
+    i = head.find(b"\x44\x89")  # Duration (float, in timecode units)
+    if i >= 0:
+        length, j = _read_vint(head, i + 2)
+        if length in (4, 8):
+            duration = struct.unpack(">f" if length == 4 else ">d", head[j:j + length])[0]
+            if duration > 0:
+                return duration * scale / 1e9
+    # Browser MediaRecorder output has no Duration; use the last Cluster timecode
+    f.seek(max(0, size - 1048576))
+    tail = f.read()
+    last = None
+    i = tail.find(b"\x1f\x43\xb6\x75")
+    while i >= 0:
+        try:
+            _, j = _read_vint(tail, i + 4)
+            if tail[j] == 0xE7:
+                length, k = _read_vint(tail, j + 1)
+                last = int.from_bytes(tail[k:k + length], "big")
+        except (ValueError, IndexError):
+            pass
+        i = tail.find(b"\x1f\x43\xb6\x75", i + 4)
+    if last is None:
+        return None
+    # The last cluster holds up to a few more seconds after its timecode
+    return last * scale / 1e9 + 5.0
+
+
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG-1 layer III
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],      # MPEG-2/2.5 layer III
+}
+_MP3_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _mp3_frame(data, i):
+    """Parse a layer III frame header at data[i]; returns (version bits, bitrate,
+    sample rate, frame length in bytes) or None"""
+    if i + 4 > len(data) or data[i] != 0xFF or data[i + 1] & 0xE6 != 0xE2:  # frame sync, layer III
+        return None
+    version_bits = (data[i + 1] >> 3) & 0x3
+    bitrate_index = data[i + 2] >> 4
+    rate_index = (data[i + 2] >> 2) & 0x3
+    if version_bits == 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version_bits == 3
+    bitrate = _MP3_BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+    sample_rate = _MP3_RATES[version_bits][rate_index]
+    padding = (data[i + 2] >> 1) & 0x1
+    frame_len = (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+    return version_bits, bitrate, sample_rate, frame_len
+
+
+def _probe_mp3(f, size):
+    head = f.read(10)
+    offset = 0
+    if head[:3] == b"ID3":
+        offset = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+    f.seek(offset)
+    # Scan the first 4 KB for a sync, reading enough past it to see the next frame
+    data = f.read(4096 + 2048)
+    for i in range(min(len(data), 4096) - 4):
+        header = _mp3_frame(data, i)
+        if header is None:
+            continue
+        version_bits, bitrate, sample_rate, frame_len = header
+        # A lone 0xFF 0xEx pair is common in arbitrary data; only trust a frame
+        # followed by another frame header of the same version and sample rate
+        following = _mp3_frame(data, i + frame_len)
+        if following is None or following[0] != version_bits or following[2] != sample_rate:
+            continue
+        samples_per_frame = 1152 if version_bits == 3 else 576
+        # A Xing/Info/VBRI header gives the exact frame count for VBR files
+        frame = data[i:i + 200]
+        for tag in (b"Xing", b"Info"):
+            j = frame.find(tag)
+            if j >= 0 and frame[j + 7] & 0x1:
+                frames = struct.unpack(">I", frame[j + 8:j + 12])[0]
+                return frames * samples_per_frame / sample_rate
+        j = frame.find(b"VBRI")
+        if j >= 0:
+            frames = struct.unpack(">I", frame[j + 14:j + 18])[0]
+            return frames * samples_per_frame / sample_rate
+        return (size - offset - i) * 8 / bitrate
+    return None
+
+
+_PROBES = (_probe_wav, _probe_flac, _probe_ogg, _probe_mp4, _probe_webm, _probe_mp3)
+
+
+def _probe_ffprobe(path):
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+            capture_output=True, timeout=10, check=True
+        ).stdout
+        duration = float(json.loads(out)["format"]["duration"])
+        return duration if duration > 0 else None
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError):
+        return None
+
+
+def probe_duration(path):
+    """Return (seconds, method) for an audio file without decoding it.
+
+    Reads container headers (WAV, FLAC, Ogg/Opus, MP4/M4A, WebM, MP3), then
+    falls back to ffprobe, then to a conservative estimate from the file size.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        for probe in _PROBES:
+            f.seek(0)
+            try:
+                duration = probe(f, size)
+            except (struct.error, ValueError, IndexError, OSError):
+                duration = None
+            if duration:
+                return duration, "header"
+    duration = _probe_ffprobe(path)
+    if duration:
+        return duration, "ffprobe"
+    return size / FALLBACK_BYTES_PER_SECOND, "size_estimate"
+
+
+# ---------------------------------------------------------------------------
+# Cost model
+# ---------------------------------------------------------------------------
+
+class RealTimeFactors:
+    """Exponentially smoothed processing-seconds per audio-second, per model"""
+
+    def __init__(self):
+        self._rtf = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name):
+        with self._lock:
+            if model_name in self._rtf:
+                return self._rtf[model_name]
+        base = model_name.split(":")[-1].split(".")[0]
+        return DEFAULT_RTF.get(base, DEFAULT_RTF["base"])
+
+    def observe(self, model_name, audio_seconds, processing_seconds):
+        if audio_seconds < 1:
+            return
+        sample = processing_seconds / audio_seconds
+        with self._lock:
+            previous = self._rtf.get(model_name)
+            self._rtf[model_name] = sample if previous is None else previous + RTF_SMOOTHING * (sample - previous)
+
+    def to_dict(self):
+        with self._lock:
+            return {name: round(rtf, 4) for name, rtf in self._rtf.items()}
+
+
+# ---------------------------------------------------------------------------
+# Admission and scheduling
+# ---------------------------------------------------------------------------
+
+class Ticket:
+    """An admitted job; `with ticket:` waits for its turn, then holds a slot"""
+
+    def __init__(self, controller, cost, seq):
+        self.controller = controller
+        self.cost = cost
+        self.seq = seq
+        self.submitted_at = time.time()
+        self.started_at = None
+
+    @property
+    def queued_seconds(self):
+        return round((self.started_at or time.time()) - self.submitted_at, 3)
+
+    def priority(self, now):
+        # Shortest job first, with ageing so long jobs eventually get a turn
+        return (self.cost - AGING_RATE * (now - self.submitted_at), self.seq)
+
+    def __enter__(self):
+        self.controller._acquire(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.controller._release(self)
+        return False
+
+
+class AdmissionController:
+    """Accept, delay (queue) or reject jobs against a per-instance compute budget.
+
+    `max_job_seconds` caps the estimated compute of a single job, and
+    `max_backlog_seconds` caps the compute queued plus running across all
+    slots. Jobs past the budget are rejected with a Retry-After estimate.
+    """
+
+    def __init__(self, slots=1, max_job_seconds=600, max_backlog_seconds=1800):
+        self.slots = slots
+        self.max_job_seconds = max_job_seconds
+        self.max_backlog_seconds = max_backlog_seconds
+        self.rtf = RealTimeFactors()
+        # Callables that must all return True before a queued job may start
+        # (ignored when nothing is running, so the queue cannot stall)
+        self.gates = []
+        # Admitted but no thread waiting on them yet (e.g. still in an executor's
+        # queue); they count towards the backlog but never block the queue
+        self._pending = []
+        # Tickets with a thread blocked in _acquire, competing for a slot
+        self._waiting = []
+        self._running = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.rejected = 0
+        self.admitted = 0
+
+    def estimate_cost(self, duration_seconds, model_name):
+        return duration_seconds * self.rtf.get(model_name)
+
+    def _backlog_seconds(self, now):
+        running = sum(max(0.0, t.cost - (now - t.started_at)) for t in self._running)
+        return running + sum(t.cost for t in self._pending) + sum(t.cost for t in self._waiting)
+
+    def submit(self, cost):
+        """Admit a job of estimated `cost` compute-seconds or raise AdmissionRejected"""
+        if cost > self.max_job_seconds:
+            self.rejected += 1
+            raise AdmissionRejected(
+                f"Audio too long for this instance (estimated {cost:.0f}s of processing, "
+                f"limit {self.max_job_seconds:.0f}s)", status=413)
+        with self._cond:
+            now = time.time()
+            backlog = self._backlog_seconds(now)
+            if backlog + cost > self.max_backlog_seconds:
+                self.rejected += 1
+                retry_after = math.ceil((backlog + cost - self.max_backlog_seconds) / self.slots)
+                raise AdmissionRejected(
+                    f"Server busy ({backlog:.0f}s of queued processing), please retry later",
+                    status=429, retry_after=max(1, retry_after))
+            ticket = Ticket(self, cost, next(self._seq))
+            self._pending.append(ticket)
+            self.admitted += 1
+            return ticket
+
+    def _acquire(self, ticket):
+        with self._cond:
+            # Only tickets whose thread is actually here take part in the ordering,
+            # otherwise one that nobody waits on could hold the head of the queue forever
+            if ticket in self._pending:
+                self._pending.remove(ticket)
+            self._waiting.append(ticket)
+            while True:
+                now = time.time()
+                if (len(self._running) < self.slots
+                        and min(self._waiting, key=lambda t: t.priority(now)) is ticket
+                        and (not self._running or all(gate() for gate in self.gates))):
+                    break
+                self._cond.wait(timeout=1.0)
+            self._waiting.remove(ticket)
+            ticket.started_at = time.time()
+            self._running.append(ticket)
+
+    def _release(self, ticket):
+        with self._cond:
+            if ticket in self._running:
+                self._running.remove(ticket)
+            elif ticket in self._waiting:
+                self._waiting.remove(ticket)
+            elif ticket in self._pending:
+                self._pending.remove(ticket)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            now = time.time()
+            return {
+                "slots": self.slots,
+                "running": len(self._running),
+                "queued": len(self._pending) + len(self._waiting),
+                "backlog_seconds": round(self._backlog_seconds(now), 1),
+                "max_job_seconds": self.max_job_seconds,
+                "max_backlog_seconds": self.max_backlog_seconds,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "real_time_factors": self.rtf.to_dict(),
+            }
+
+
+def controller_from_env(slots):
+    """Build an AdmissionController from ADMISSION_* environment variables"""
+    return AdmissionController(
+        slots=slots,
+        max_job_seconds=float(os.getenv("ADMISSION_MAX_JOB_SECONDS", 600)),
+        max_backlog_seconds=float(os.getenv("ADMISSION_MAX_BACKLOG_SECONDS", 1800)),
+    )
@@ -1,8 +1,18 @@
+from topology import apply_topology, configure_torch, plan_topology
+
+# Pin thread pools before gradio (numpy) and torch are imported
+TOPOLOGY = apply_topology(plan_topology())
+
 import gradio as gr
 import whisper
+import torch
 import tempfile
 import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from notion_client import Client
+from exporters import Segments, create_notion_page, iter_markdown
+from process_pipeline import SAMPLE_RATE, load_audio
 
 # Initialize Whisper model
 model = None
@@ -10,6 +20,7 @@ model = None
 print("Loading Whisper model...")
 try:
     model = whisper.load_model("tiny")
+    configure_torch(TOPOLOGY)
     print("Whisper tiny model loaded successfully!")
 except Exception as e:
     print(f"Error loading Whisper model: {e}")
@@ -28,88 +39,167 @@ if NOTION_TOKEN and NOTION_DATABASE_ID:
     except Exception as e:
         print(f"Error initializing Notion client: {e}")
 
-def transcribe_audio(audio_file, meeting_title):
-    """Transcribe audio and optionally export to Notion"""
+# Queue and batching settings
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 4))      # Uploads handled per batched call (BATCH_DECODE)
+WINDOW_BATCH_SIZE = int(os.getenv("WINDOW_BATCH_SIZE", 8))  # 30 s windows per model call
+QUEUE_MAX_SIZE = int(os.getenv("QUEUE_MAX_SIZE", 32))       # Requests waiting before new ones are turned away
+WINDOW_SAMPLES = 30 * SAMPLE_RATE
+
+# Batched decoding (BATCH_DECODE=true) cuts every file into fixed 30 s windows and
+# decodes windows from several uploads together. It is faster for many short
+# uploads but less accurate than model.transcribe: words straddling a window edge
+# can be cut and no earlier text conditions the next window. Off by default.
+BATCH_DECODE = os.getenv("BATCH_DECODE", "false").lower() == "true"
+
+# Whisper's own quality checks (model.transcribe defaults), applied per window
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4  # higher means repetition loops
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# Notion exports run in the background so users don't wait on the Notion API
+notion_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="notion")
+notion_jobs = {}
+
+def needs_fallback(result):
+    """Whisper's retry rule: repetitive or low-confidence text, unless the window is silence"""
+    if result.no_speech_prob > NO_SPEECH_THRESHOLD:
+        return False
+    return result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+
+def is_silent(result):
+    """Whisper's no-speech rule: only silent when the text is also low-confidence"""
+    return result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD
+
+def decode_with_fallback(mels):
+    """Decode a batch of windows greedily, re-decoding the windows that fail
+    Whisper's checks at increasing temperatures, as model.transcribe does"""
+    results = [None] * len(mels)
+    todo = list(range(len(mels)))
+    for temperature in TEMPERATURES:
+        options = whisper.DecodingOptions(
+            fp16=False, without_timestamps=True, temperature=temperature,
+            best_of=5 if temperature > 0 else None
+        )
+        for i, result in zip(todo, whisper.decode(model, mels[todo], options)):
+            results[i] = result
+        todo = [i for i in todo if needs_fallback(results[i])]
+        if not todo:
+            break
+    return results
+
+def transcribe_files(audio_files, progress=None):
+    """Transcribe several files: batched windows with BATCH_DECODE, else one model.transcribe per file"""
+    if BATCH_DECODE:
+        return batch_transcribe(audio_files, progress)
+    texts = []
+    for i, audio_file in enumerate(audio_files):
+        audio = load_audio(audio_file, TOPOLOGY["ffmpeg_threads"])
+        result = model.transcribe(audio, fp16=False, verbose=None)
+        texts.append(result["text"].strip())
+        if progress is not None:
+            progress((i + 1) / len(audio_files), desc=f"Transcribed {i + 1}/{len(audio_files)} files")
+    return texts
+
+def batch_transcribe(audio_files, progress=None):
+    """Transcribe several files with batched decoder calls.
+    
+    Every file is cut into 30 s windows and windows from all files are
+    decoded together, WINDOW_BATCH_SIZE at a time, so a batch of short
+    uploads costs a few model calls instead of one full pass per file.
+    Each window gets Whisper's temperature fallback and no-speech rule, but
+    windows are hard cuts (see BATCH_DECODE).
+    """
+    windows = []  # (file index, log-mel)
+    for index, audio_file in enumerate(audio_files):
+        audio = load_audio(audio_file, TOPOLOGY["ffmpeg_threads"])
+        for start in range(0, max(len(audio), 1), WINDOW_SAMPLES):
+            window = whisper.pad_or_trim(audio[start:start + WINDOW_SAMPLES])
+            windows.append((index, whisper.log_mel_spectrogram(window, n_mels=model.dims.n_mels)))
+    
+    texts = [[] for _ in audio_files]
+    for start in range(0, len(windows), WINDOW_BATCH_SIZE):
+        batch = windows[start:start + WINDOW_BATCH_SIZE]
+        mels = torch.stack([mel for _, mel in batch]).to(model.device)
+        results = decode_with_fallback(mels)
+        for (index, _), result in zip(batch, results):
+            if not is_silent(result) and result.text.strip():
+                texts[index].append(result.text.strip())
+        if progress is not None:
+            progress((start + len(batch)) / len(windows), desc=f"Transcribed {start + len(batch)}/{len(windows)} segments")
+    return [" ".join(parts) for parts in texts]
+
+def export_transcript_to_notion(transcript, meeting_title):
+    """Create the Notion page for a transcript (runs on notion_executor)"""
+    response = create_notion_page(notion_client, NOTION_DATABASE_ID, meeting_title, Segments.from_text(transcript))
+    return response['id']
+
+def transcribe_audio(audio_files, meeting_titles, progress=gr.Progress()):
+    """Transcribe a batch of queued uploads and start their Notion exports.
+    
+    Gradio calls this with lists (batch=True, BATCH_DECODE); it returns one transcript,
+    one Notion status and one export job id per queued request.
+    """
+    transcripts = [""] * len(audio_files)
+    statuses = [""] * len(audio_files)
+    job_ids = [None] * len(audio_files)
+    
     if model is None:
-        return "Error: Whisper model not loaded", ""
+        return ["Error: Whisper model not loaded"] * len(audio_files), statuses, job_ids
+    
+    pending = []
+    for i, audio_file in enumerate(audio_files):
+        if audio_file is None:
+            transcripts[i] = "Error: No audio file provided"
+        else:
+            pending.append(i)
     
-    if audio_file is None:
-        return "Error: No audio file provided", ""
+    if pending:
+        try:
+            print(f"Processing batch of {len(pending)} audio files")
+            results = transcribe_files([audio_files[i] for i in pending], progress)
+            for i, transcript in zip(pending, results):
+                transcripts[i] = transcript or "Error: Transcription returned empty result"
+        except Exception as e:
+            for i in pending:
+                transcripts[i] = f"Error during transcription: {str(e)}"
+            pending = []
     
+    # Export to Notion if configured, without holding up the transcription queue
+    for i in pending:
+        if notion_client and meeting_titles[i] and not transcripts[i].startswith("Error"):
+            job_id = uuid.uuid4().hex
+            notion_jobs[job_id] = notion_executor.submit(export_transcript_to_notion, transcripts[i], meeting_titles[i])
+            job_ids[i] = job_id
+            statuses[i] = "⏳ Exporting to Notion..."
+    
+    return transcripts, statuses, job_ids
+
+def transcribe_one(audio_file, meeting_title, progress=gr.Progress()):
+    """Transcribe a single upload (the event handler unless BATCH_DECODE is set)"""
+    transcripts, statuses, job_ids = transcribe_audio([audio_file], [meeting_title], progress)
+    return transcripts[0], statuses[0], job_ids[0]
+
+def wait_for_notion_export(job_id):
+    """Push the background Notion export's outcome to notion_status"""
+    future = notion_jobs.pop(job_id, None) if job_id else None
+    if future is None:
+        return gr.update()
     try:
-        # Transcribe audio
-        print(f"Processing audio file: {audio_file}")
-        result = model.transcribe(audio_file, fp16=False, verbose=True)
-        
-        transcript = result.get("text", "")
-        
-        if not transcript:
-            return "Error: Transcription returned empty result", ""
-        
-        # Export to Notion if configured
-        notion_status = ""
-        if notion_client and meeting_title:
-            try:
-                # Create Notion page
-                children = [
-                    {
-                        "object": "block",
-                        "type": "heading_2",
-                        "heading_2": {
-                            "rich_text": [{"type": "text", "text": {"content": "📝 Meeting Transcript"}}]
-                        }
-                    },
-                    {
-                        "object": "block",
-                        "type": "paragraph",
-                        "paragraph": {
-                            "rich_text": [{"type": "text", "text": {"content": transcript}}]
-                        }
-                    }
-                ]
-                
-                response = notion_client.pages.create(
-                    parent={"database_id": NOTION_DATABASE_ID},
-                    properties={
-                        "Name": {
-                            "title": [
-                                {
-                                    "text": {
-                                        "content": f"Meeting Notes - {meeting_title}"
-                                    }
-                                }
-                            ]
-                        }
-                    },
-                    children=children
-                )
-                
-                notion_status = f"✅ Successfully exported to Notion! Page ID: {response['id']}"
-            except Exception as e:
-                notion_status = f"❌ Notion export failed: {str(e)}"
-        
-        return transcript, notion_status
-        
+        return f"✅ Successfully exported to Notion! Page ID: {future.result()}"
     except Exception as e:
-        return f"Error during transcription: {str(e)}", ""
+        return f"❌ Notion export failed: {str(e)}"
 
 def export_to_google_docs(transcript, meeting_title):
     """Format text for Google Docs export"""
     if not transcript:
         return "No transcript to export"
     
-    formatted_text = f"""
-# {meeting_title or 'Untitled Meeting'}
-
-## Meeting Transcript
-
-{transcript}
-
----
-*Generated by Minute Mate on Hugging Face Spaces*
-    """.strip()
-    
-    return formatted_text
+    return "".join(iter_markdown(
+        Segments.from_text(transcript),
+        title=meeting_title,
+        footer="*Generated by Minute Mate on Hugging Face Spaces*"
+    )).strip()
 
 # Create Gradio interface
 with gr.Blocks(title="Minute Mate - Audio Transcription & Export") as demo:
@@ -121,7 +211,7 @@ with gr.Blocks(title="Minute Mate - Audio Transcription & Export") as demo:
             audio_input = gr.Audio(
                 label="Upload Audio File",
                 type="filepath",
-                source="upload"
+                sources=["upload"]
             )
             title_input = gr.Textbox(
                 label="Meeting Title (optional)",
@@ -149,11 +239,25 @@ with gr.Blocks(title="Minute Mate - Audio Transcription & Export") as demo:
             placeholder="Formatted text for Google Docs will appear here..."
         )
     
+    notion_job = gr.State()
+    
     # Event handlers
+    # With BATCH_DECODE queued uploads are batched into one model call, otherwise
+    # each event handles one upload; the Notion export then finishes in the
+    # background and updates its status box when done
     transcribe_btn.click(
-        fn=transcribe_audio,
+        fn=transcribe_audio if BATCH_DECODE else transcribe_one,
         inputs=[audio_input, title_input],
-        outputs=[transcript_output, notion_status]
+        outputs=[transcript_output, notion_status, notion_job],
+        batch=BATCH_DECODE,
+        max_batch_size=MAX_BATCH_SIZE,
+        concurrency_limit=TOPOLOGY["workers"],
+        concurrency_id="whisper"
+    ).then(
+        fn=wait_for_notion_export,
+        inputs=notion_job,
+        outputs=notion_status,
+        concurrency_limit=None
     )
     
     google_docs_btn.click(
@@ -175,6 +279,9 @@ with gr.Blocks(title="Minute Mate - Audio Transcription & Export") as demo:
     - Notion export requires valid token and database ID
     """)
 
+# Bounded request queue: excess users wait their turn instead of overloading the model
+demo.queue(max_size=QUEUE_MAX_SIZE, default_concurrency_limit=1)
+
 # Launch the app
 if __name__ == "__main__":
     demo.launch(server_name="0.0.0.0", server_port=7860) 
\ No newline at end of file
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+# Fast-boot support for the Whisper services
+# Heavy imports and model loading run in a background thread so Flask can
+# answer /health straight away (liveness), while readiness only flips once
+# the models are loaded and a dummy inference has warmed up the allocator,
+# kernels, mel filters and tokenizer. Boot timings are kept so the time to
+# first useful response is measured rather than guessed.
+
+logger = logging.getLogger(__name__)
+
+PROCESS_STARTED_AT = time.time()
+
+WARMUP_SECONDS = 1.0
+BOOT_REPORT_FILE = os.getenv("BOOT_REPORT_FILE", "")
+# How long a request that needs the models waits for them before a 503
+BOOT_WAIT_SECONDS = float(os.getenv("BOOT_WAIT_SECONDS", 30))
+
+
+class BootState:
+    """Tracks liveness/readiness and per-phase timings of service start-up"""
+
+    def __init__(self, name):
+        self.name = name
+        self.phase = "starting"
+        self.ready = False
+        self.error = None
+        self.timings = {}
+        self.ready_at = None
+        self._thread = None
+        self._ready_event = threading.Event()
+
+    def mark(self, phase, started):
+        """Record how long `phase` took, given the time it started"""
+        self.timings[phase] = round(time.time() - started, 3)
+        logger.info(f"{self.name} boot: {phase} took {self.timings[phase]:.2f}s")
+
+    def run(self, load_fn):
+        """Run `load_fn(boot)` and flip readiness when it returns"""
+        try:
+            load_fn(self)
+            self.ready = True
+            self.phase = "ready"
+        except Exception as e:
+            logger.error(f"{self.name} boot failed: {e}")
+            self.error = str(e)
+            self.phase = "failed"
+        finally:
+            self.ready_at = time.time()
+            self.timings["time_to_ready"] = round(self.ready_at - PROCESS_STARTED_AT, 3)
+            self._ready_event.set()
+            self._write_report()
+
+    def start(self, load_fn, background=True):
+        """Start loading, in a daemon thread when `background` (fast boot)"""
+        if not background:
+            self.run(load_fn)
+            return
+        self._thread = threading.Thread(target=self.run, args=(load_fn,), name=f"{self.name}-boot", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        return self._ready_event.wait(timeout)
+
+    def wait_ready(self, timeout=BOOT_WAIT_SECONDS):
+        """True once ready; requests arriving mid-boot wait up to `timeout` first"""
+        if not self.ready:
+            self.wait(timeout)
+        return self.ready
+
+    def retry_after(self):
+        """Rough seconds until ready, for Retry-After headers while booting"""
+        previous = _previous_report().get("timings", {}).get("time_to_ready")
+        if previous:
+            return max(1, int(previous - (time.time() - PROCESS_STARTED_AT)))
+        return 10
+
+    def to_dict(self):
+        return {
+            "live": True,
+            "ready": self.ready,
+            "phase": self.phase,
+            "error": self.error,
+            "uptime_seconds": round(time.time() - PROCESS_STARTED_AT, 3),
+            "timings": self.timings,
+        }
+
+    def _write_report(self):
+        if not BOOT_REPORT_FILE:
+            return
+        try:
+            with open(BOOT_REPORT_FILE, "w") as f:
+                json.dump(self.to_dict(), f, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not write boot report: {e}")
+
+
+def _previous_report():
+    if not BOOT_REPORT_FILE:
+        return {}
+    try:
+        with open(BOOT_REPORT_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def fast_boot_enabled():
+    """Opt-in: with FAST_BOOT=true the server accepts connections while models load.
+
+    Leave it off where the process manager recycles workers often (gunicorn
+    --max-requests): blocking start-up makes those requests wait instead.
+    """
+    return os.getenv("FAST_BOOT", "false").lower() == "true"
+
+
+def warm_up(transcribe_fn):
+    """Run one dummy inference on a second of silence.
+
+    `transcribe_fn(audio)` must run the model end to end on a float32 16 kHz
+    array; the first call pays for lazy initialisation so real requests don't.
+    """
+    audio = np.zeros(int(16000 * WARMUP_SECONDS), dtype=np.float32)
+    transcribe_fn(audio)
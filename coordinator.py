@@ -0,0 +1,515 @@
+import argparse
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, Response, request, jsonify
+from flask_cors import CORS
+
+from admission import probe_duration
+
+# Transcription coordinator: shards jobs across a pool of Whisper API hosts
+# Jobs are placed on a consistent-hash ring keyed by the audio hash, so a
+# re-upload lands on the worker whose transcript cache already holds it.
+# Among the first few ring candidates the least-loaded healthy worker is
+# chosen, attempts that fail before the worker starts on them are retried on
+# the next candidate (a timeout waiting for the result is not, as the first
+# worker may still be transcribing) and very long files are split into
+# chunks that run on several workers at once; their segments are merged and
+# stored as one meeting on a worker, and meeting reads (/summarize, /export,
+# /meetings) are forwarded to the worker holding the meeting.
+#
+# Try it locally with three workers:
+#   python coordinator.py --spawn 3
+# or against workers you started yourself:
+#   PORT=5002 python whisper_api.py &  PORT=5003 python whisper_api.py &
+#   WHISPER_WORKERS=http://127.0.0.1:5002,http://127.0.0.1:5003 python coordinator.py
+# or under gunicorn (one process: the ring state is per process):
+#   WHISPER_WORKERS=... gunicorn -w 1 -k gthread --threads 16 coordinator:app
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VIRTUAL_NODES = 64
+CANDIDATES = int(os.getenv("COORDINATOR_CANDIDATES", 2))  # ring successors considered per job
+MAX_ATTEMPTS = int(os.getenv("COORDINATOR_MAX_ATTEMPTS", 3))
+HEALTH_INTERVAL = float(os.getenv("COORDINATOR_HEALTH_INTERVAL", 5))
+REQUEST_TIMEOUT = float(os.getenv("COORDINATOR_TIMEOUT", 300))
+SPLIT_SECONDS = float(os.getenv("COORDINATOR_SPLIT_SECONDS", 600))  # split files longer than this
+MAX_OWNERS = 10000  # meeting id -> worker entries remembered for routing reads
+MEETINGS_TOKEN = os.getenv("MEETINGS_TOKEN", "")  # the workers' token, for reading and storing chunks
+
+# Statuses worth retrying elsewhere: worker busy, booting or unreachable. A 500
+# is what /transcribe returns for an undecodable upload, so it is the request's
+# error: not retried, and the worker stays healthy
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# Request fields the workers act on (language hint, language-cache session, title)
+FORWARD_FIELDS = ("language", "session_id", "user", "title")
+FORWARD_HEADERS = ("X-Session-Id",)
+
+
+def _hash(value):
+    return int(hashlib.md5(value.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes"""
+
+    def __init__(self, nodes, vnodes=VIRTUAL_NODES):
+        self._ring = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._keys = [h for h, _ in self._ring]
+        self.nodes = list(nodes)
+
+    def successors(self, key):
+        """Distinct nodes in ring order starting at the owner of `key`"""
+        if not self._ring:
+            return []
+        seen = []
+        start = bisect.bisect(self._keys, _hash(key)) % len(self._ring)
+        for i in range(len(self._ring)):
+            node = self._ring[(start + i) % len(self._ring)][1]
+            if node not in seen:
+                seen.append(node)
+                if len(seen) == len(self.nodes):
+                    break
+        return seen
+
+
+class Worker:
+    """Coordinator-side view of one Whisper API host"""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.healthy = False
+        self.inflight = 0
+        self.remote_load = 0
+        self.failures = 0
+        self.last_checked = None
+        self.last_error = None
+
+    @property
+    def load(self):
+        # Our own in-flight requests plus what the worker reports queued/running
+        return self.inflight + self.remote_load
+
+    def check(self):
+        try:
+            with urllib.request.urlopen(f"{self.url}/health", timeout=2) as resp:
+                health = json.loads(resp.read())
+            # Whisper API /health stays 200 while booting; only route once ready
+            self.healthy = health.get("ready", True)
+            admission = health.get("admission") or {}
+            self.remote_load = admission.get("running", 0) + admission.get("queued", 0)
+            self.last_error = None
+        except (OSError, ValueError) as e:
+            self.healthy = False
+            self.last_error = str(e)
+        self.last_checked = time.time()
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "inflight": self.inflight,
+            "remote_load": self.remote_load,
+            "failures": self.failures,
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+        }
+
+
+class WorkerError(Exception):
+    def __init__(self, message, status=502, retry=True):
+        super().__init__(message)
+        self.status = status
+        self.retry = retry
+
+
+def _post_audio(url, filename, data, fields=None, headers=None):
+    """POST one audio file (plus form `fields`) as multipart/form-data; returns the parsed JSON body"""
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        for name, value in (fields or {}).items()
+    ]
+    body = b"".join(parts + [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode("utf-8"),
+        data,
+        f"\r\n--{boundary}--\r\n".encode("utf-8"),
+    ])
+    req = urllib.request.Request(url, data=body, method="POST", headers={
+        **(headers or {}),
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+    })
+    return _open_json(req, url)
+
+
+def _request_json(url, method="GET", payload=None):
+    """Call a worker's meeting API with the meetings token; returns the parsed JSON body"""
+    headers = {"Authorization": f"Bearer {MEETINGS_TOKEN}"} if MEETINGS_TOKEN else {}
+    data = None
+    if payload is not None:
+        data = json.dumps(payload).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    return _open_json(urllib.request.Request(url, data=data, method=method, headers=headers), url)
+
+
+def _open_json(req, url):
+    try:
+        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", e.reason)
+        except ValueError:
+            message = e.reason
+        raise WorkerError(f"{url}: {e.code} {message}", status=e.code, retry=e.code in RETRY_STATUSES)
+    except TimeoutError as e:
+        # The request was sent and may still be running there; another worker
+        # would do the same job twice (connect timeouts arrive as URLError below)
+        raise WorkerError(f"{url}: no response within {REQUEST_TIMEOUT:g}s ({e})", status=504, retry=False)
+    except (OSError, ValueError) as e:
+        raise WorkerError(f"{url}: {e}")
+
+
+class Coordinator:
+    """Routes transcription jobs over a pool of workers"""
+
+    def __init__(self, urls):
+        self.workers = {url.rstrip("/"): Worker(url) for url in urls}
+        self.ring = HashRing(list(self.workers))
+        self._lock = threading.Lock()
+        self._chunk_executor = ThreadPoolExecutor(max_workers=max(2, len(self.workers) * 2), thread_name_prefix="chunk")
+        self._owners = OrderedDict()  # meeting id -> url of the worker that stored it
+        self._health_thread = None
+
+    def start(self):
+        for worker in self.workers.values():
+            worker.check()
+        self._health_thread = threading.Thread(target=self._health_loop, name="health", daemon=True)
+        self._health_thread.start()
+        return self
+
+    def _health_loop(self):
+        while True:
+            time.sleep(HEALTH_INTERVAL)
+            for worker in self.workers.values():
+                worker.check()
+
+    def route(self, key):
+        """Workers to try for `key`: least-loaded of the first CANDIDATES healthy
+        ring successors first (owner wins ties), then the rest in ring order"""
+        order = [self.workers[url] for url in self.ring.successors(key)]
+        healthy = [w for w in order if w.healthy] or order
+        head = sorted(healthy[:CANDIDATES], key=lambda w: (w.load, healthy.index(w)))
+        return head + [w for w in healthy if w not in head]
+
+    def remember(self, meeting_id, url):
+        with self._lock:
+            self._owners[meeting_id] = url
+            self._owners.move_to_end(meeting_id)
+            while len(self._owners) > MAX_OWNERS:
+                self._owners.popitem(last=False)
+
+    def owner(self, meeting_id):
+        """Worker holding a meeting: the one that stored it, else its ring owner"""
+        with self._lock:
+            url = self._owners.get(meeting_id)
+        return self.workers[url or self.ring.successors(meeting_id)[0]]
+
+    def dispatch(self, key, filename, data, fields=None, headers=None):
+        """Send one file to the best worker, retrying the next one on failure"""
+        errors = []
+        for worker in self.route(key)[:MAX_ATTEMPTS]:
+            with self._lock:
+                worker.inflight += 1
+            try:
+                result = _post_audio(f"{worker.url}/transcribe", filename, data, fields, headers)
+                result["worker"] = worker.url
+                if result.get("transcript_id"):
+                    self.remember(result["transcript_id"], worker.url)
+                return result
+            except WorkerError as e:
+                logger.warning(f"Job {key[:12]} failed on {worker.url}: {e}")
+                errors.append(str(e))
+                if not e.retry:
+                    raise
+                worker.failures += 1
+                if e.status in (502, 504):
+                    worker.healthy = False
+            finally:
+                with self._lock:
+                    worker.inflight -= 1
+        raise WorkerError("All workers failed: " + "; ".join(errors), status=503, retry=False)
+
+    def transcribe(self, path, filename, fields=None, headers=None):
+        with open(path, "rb") as f:
+            data = f.read()
+        # Same audio in another language is a different transcript on the workers too
+        key = _ring_key(data, (fields or {}).get("language"))
+        duration, _ = probe_duration(path)
+        if duration <= SPLIT_SECONDS or len(self.workers) < 2:
+            return self.dispatch(key, filename, data, fields, headers)
+        return self._transcribe_split(path, duration, key, fields or {}, headers)
+
+    def _transcribe_split(self, path, duration, key, fields, headers=None):
+        """Cut a long file into chunks, transcribe them on several workers and
+        store the merged transcript as one meeting under `key`"""
+        chunk_dir = tempfile.mkdtemp(prefix="chunks-")
+        try:
+            chunks = split_audio(path, chunk_dir, SPLIT_SECONDS)
+            durations = [probe_duration(chunk)[0] for chunk in chunks]
+            logger.info(f"Split {duration:.0f}s of audio into {len(chunks)} chunks")
+
+            def run(chunk_path):
+                with open(chunk_path, "rb") as f:
+                    data = f.read()
+                key = _ring_key(data, (fields or {}).get("language"))
+                return self.dispatch(key, os.path.basename(chunk_path), data, fields, headers)
+
+            results = list(self._chunk_executor.map(run, chunks))
+        finally:
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+
+        offsets = list(itertools.accumulate(durations[:-1], initial=0.0))
+        parts = self._chunk_executor.map(self._chunk_segments, results, durations)
+        segments = [
+            {"start": round(offset + seg["start"], 2), "end": round(offset + seg["end"], 2), "text": seg["text"]}
+            for offset, part in zip(offsets, parts) for seg in part
+        ]
+        languages = Counter(r["language"] for r in results if r.get("language"))
+        language = fields.get("language") or (languages.most_common(1)[0][0] if languages else None)
+        return {
+            "text": " ".join(seg["text"] for seg in segments),
+            "transcript_id": key,
+            "meeting_id": key,
+            "language": language,
+            "segments": segments,
+            "worker": self._store(key, segments, language, fields.get("title")),
+            "chunks": [
+                {"offset": round(offset, 2), "worker": r["worker"], "transcript_id": r.get("transcript_id")}
+                for offset, r in zip(offsets, results)
+            ],
+        }
+
+    def _chunk_segments(self, result, duration):
+        """A chunk's timed segments, read back page by page from the worker that stored it"""
+        transcript_id = result.get("transcript_id")
+        url = f"{result['worker']}/meetings/{transcript_id}/transcript"
+        segments, offset = [], 0
+        try:
+            while transcript_id and offset is not None:
+                page = _request_json(f"{url}?offset={offset}&limit=1000")
+                segments += page["segments"]
+                offset = page["next_offset"]
+            if transcript_id:
+                return segments
+        except (WorkerError, KeyError) as e:
+            logger.warning(f"Could not read segments of chunk {transcript_id}: {e}")
+        # Not stored on the worker: keep the chunk's text as one segment spanning it
+        text = result.get("text", "").strip()
+        return [{"start": 0.0, "end": duration, "text": text}] if text else []
+
+    def _store(self, key, segments, language, title=None):
+        """Store a merged transcript on the first worker that takes it; returns its url"""
+        payload = {"segments": segments, "language": language, "title": title}
+        for worker in self.route(key)[:MAX_ATTEMPTS]:
+            try:
+                _request_json(f"{worker.url}/meetings/{key}", "PUT", payload)
+            except WorkerError as e:
+                logger.warning(f"Could not store meeting {key[:12]} on {worker.url}: {e}")
+                continue
+            self.remember(key, worker.url)
+            return worker.url
+        return None
+
+    def to_dict(self):
+        return {
+            "workers": [w.to_dict() for w in self.workers.values()],
+            "healthy_workers": sum(w.healthy for w in self.workers.values()),
+            "candidates": CANDIDATES,
+            "split_seconds": SPLIT_SECONDS,
+        }
+
+
+def _ring_key(data, language=None):
+    """Ring key of an upload: its content hash (as the workers compute it), plus the language if given"""
+    key = hashlib.sha256(data).hexdigest()[:32]
+    return f"{key}-{language}" if language else key
+
+
+def split_audio(path, out_dir, chunk_seconds):
+    """Split audio into 16 kHz mono FLAC chunks of `chunk_seconds`"""
+    pattern = os.path.join(out_dir, "chunk%04d.flac")
+    subprocess.run([
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", path,
+        "-ac", "1", "-ar", "16000", "-c:a", "flac",
+        "-f", "segment", "-segment_time", str(chunk_seconds), pattern,
+    ], check=True)
+    return sorted(os.path.join(out_dir, name) for name in os.listdir(out_dir))
+
+
+app = Flask(__name__)
+CORS(app)
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_MB", 50)) * 1024 * 1024
+coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def worker_urls(value):
+    return [u.strip() for u in value.split(",") if u.strip()]
+
+
+def get_coordinator():
+    """The pool, built from WHISPER_WORKERS on first use when the app was
+    imported by a WSGI server rather than started from __main__; None if unconfigured"""
+    global coordinator
+    with _coordinator_lock:
+        if coordinator is None:
+            urls = worker_urls(os.getenv("WHISPER_WORKERS", ""))
+            if not urls:
+                return None
+            coordinator = Coordinator(urls).start()
+            logger.info(f"Coordinating {len(urls)} workers: {', '.join(urls)}")
+    return coordinator
+
+
+def not_configured_response():
+    return jsonify({"error": "No workers configured (set WHISPER_WORKERS)"}), 503
+
+
+@app.route("/health", methods=["GET"])
+def health_check():
+    """Coordinator health: ok while at least one worker is healthy"""
+    pool = get_coordinator()
+    if pool is None:
+        return not_configured_response()
+    status = pool.to_dict()
+    status["status"] = "ok" if status["healthy_workers"] else "no_healthy_workers"
+    return jsonify(status), 200 if status["healthy_workers"] else 503
+
+
+@app.route("/transcribe", methods=["POST"])
+def transcribe_audio():
+    """Same contract as the Whisper API's /transcribe, served by the pool"""
+    pool = get_coordinator()
+    if pool is None:
+        return not_configured_response()
+    if "audio" not in request.files:
+        return jsonify({"error": "No audio file provided"}), 400
+
+    audio_file = request.files["audio"]
+    extension = os.path.splitext(audio_file.filename or "")[1] or ".wav"
+    with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as temp_file:
+        audio_file.save(temp_file.name)
+        temp_path = temp_file.name
+    fields = {name: request.form[name] for name in FORWARD_FIELDS if request.form.get(name)}
+    headers = {name: request.headers[name] for name in FORWARD_HEADERS if request.headers.get(name)}
+    try:
+        return jsonify(pool.transcribe(temp_path, audio_file.filename or f"audio{extension}", fields, headers))
+    except WorkerError as e:
+        logger.error(f"Transcription failed: {e}")
+        return jsonify({"error": str(e)}), e.status
+    except (subprocess.CalledProcessError, OSError) as e:
+        return jsonify({"error": f"Could not split audio: {e}"}), 500
+    finally:
+        os.unlink(temp_path)
+
+
+def forward(worker):
+    """Relay the current request to `worker` and its response back to the client"""
+    headers = {name: request.headers[name] for name in ("Authorization", "Content-Type") if name in request.headers}
+    req = urllib.request.Request(f"{worker.url}{request.full_path.rstrip('?')}",
+                                 data=request.get_data() or None, method=request.method, headers=headers)
+    try:
+        resp = urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        resp = e
+    except OSError as e:
+        return jsonify({"error": f"{worker.url}: {e}"}), 502
+    with resp:
+        relayed = {name: resp.headers[name] for name in ("Content-Disposition", "Retry-After") if name in resp.headers}
+        return Response(resp.read(), resp.status, headers=relayed, content_type=resp.headers.get("Content-Type"))
+
+
+@app.route("/meetings/<meeting_id>", methods=["GET"])
+@app.route("/meetings/<meeting_id>/transcript", methods=["GET"])
+def meeting_proxy(meeting_id):
+    """Meeting reads go to the worker holding the meeting"""
+    pool = get_coordinator()
+    if pool is None:
+        return not_configured_response()
+    return forward(pool.owner(meeting_id))
+
+
+@app.route("/summarize", methods=["POST"])
+@app.route("/export/<fmt>", methods=["GET", "POST"])
+def meeting_read_proxy(fmt=None):
+    """Same contract as the Whisper API; by meeting_id on its worker, an inline transcript anywhere"""
+    pool = get_coordinator()
+    if pool is None:
+        return not_configured_response()
+    data = request.get_json(silent=True) or request.args
+    meeting_id = data.get("meeting_id") or data.get("transcript_id")
+    return forward(pool.owner(meeting_id) if meeting_id else pool.route(uuid.uuid4().hex)[0])
+
+
+def spawn_local_workers(count, base_port):
+    """Start `count` whisper_api.py processes on consecutive ports (for testing).
+
+    Each gets its own MEETING_DB (meetings-<port>.db) so they don't contend for
+    one SQLite file.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "whisper_api.py")
+    db_dir = os.path.dirname(os.getenv("MEETING_DB", "meetings.db"))
+    processes, urls = [], []
+    for i in range(count):
+        port = base_port + i
+        env = dict(os.environ, PORT=str(port), HOST="127.0.0.1",
+                   MEETING_DB=os.path.join(db_dir, f"meetings-{port}.db"))
+        processes.append(subprocess.Popen([sys.executable, script], env=env))
+        urls.append(f"http://127.0.0.1:{port}")
+    return processes, urls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shard transcription across Whisper API workers")
+    parser.add_argument("--workers", default=os.getenv("WHISPER_WORKERS", ""),
+                        help="Comma-separated worker base URLs")
+    parser.add_argument("--spawn", type=int, default=0, help="Start this many local whisper_api.py workers")
+    parser.add_argument("--worker-port", type=int, default=5101, help="First port for spawned workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5100)))
+    args = parser.parse_args()
+
+    urls = worker_urls(args.workers)
+    processes = []
+    if args.spawn:
+        processes, spawned = spawn_local_workers(args.spawn, args.worker_port)
+        urls += spawned
+    if not urls:
+        parser.error("no workers configured (use --workers, WHISPER_WORKERS or --spawn)")
+
+    coordinator = Coordinator(urls).start()
+    logger.info(f"Coordinating {len(urls)} workers: {', '.join(urls)}")
+    try:
+        app.run(host=args.host, port=args.port, debug=False)
+    finally:
+        for process in processes:
+            process.terminate()
@@ -0,0 +1,396 @@
+import collections
+import json
+import re
+import struct
+import threading
+import zipfile
+from array import array
+from xml.sax.saxutils import escape
+
+# Transcript export subsystem
+# Whisper segments are kept once in a compact form (two float arrays, one
+# offsets array and a single string) and every output format is streamed
+# from them by a generator: SRT/VTT subtitles, Markdown, DOCX, JSON and
+# Notion blocks. Exporting the same meeting in several formats never re-runs
+# transcription or builds several full copies of the text in memory.
+
+# Notion rejects rich_text items longer than 2000 characters and more than
+# 100 blocks per request
+NOTION_TEXT_LIMIT = 2000
+NOTION_BATCH_SIZE = 100
+
+PARAGRAPH_CHARS = 1500
+PARAGRAPH_PAUSE = 2.0  # seconds of silence that start a new paragraph
+
+NO_ACTION_ITEMS = "No action items found."
+
+
+class Segments:
+    """Transcript segments packed into arrays and one string"""
+
+    __slots__ = ("starts", "ends", "offsets", "text", "language", "timed")
+
+    def __init__(self, starts, ends, offsets, text, language=None, timed=True):
+        self.starts = starts
+        self.ends = ends
+        self.offsets = offsets
+        self.text = text
+        self.language = language
+        self.timed = timed
+
+    @classmethod
+    def from_whisper(cls, segments, language=None):
+        """Pack Whisper segments (dicts, or faster-whisper objects) into arrays"""
+        starts, ends, offsets, parts = array("f"), array("f"), array("I", [0]), []
+        for seg in segments:
+            get = seg.get if isinstance(seg, dict) else lambda key: getattr(seg, key)
+            text = get("text").strip()
+            if not text:
+                continue
+            starts.append(get("start"))
+            ends.append(get("end"))
+            parts.append(text)
+            offsets.append(offsets[-1] + len(text))
+        return cls(starts, ends, offsets, "".join(parts), language)
+
+    @classmethod
+    def from_text(cls, text, language=None):
+        """Segments for a plain transcript without timings, split on sentences"""
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", text or "") if s.strip()]
+        segments = cls.from_whisper(({"start": 0.0, "end": 0.0, "text": s} for s in sentences), language)
+        segments.timed = False
+        return segments
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        return self.starts[i], self.ends[i], self.text[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def slice(self, start, stop):
+        """Iterate segments start..stop-1 (for paged reads)"""
+        for i in range(max(0, start), min(stop, len(self))):
+            yield self[i]
+
+    def iter_text(self):
+        """Yield the full transcript text piece by piece, space separated"""
+        for i, (_, _, text) in enumerate(self):
+            yield text if i == 0 else " " + text
+
+    def full_text(self):
+        return "".join(self.iter_text())
+
+    def duration(self):
+        return float(self.ends[-1]) if self.timed and len(self) else None
+
+    def nbytes(self):
+        return (self.starts.itemsize * len(self.starts) * 2 + self.offsets.itemsize * len(self.offsets)
+                + len(self.text.encode("utf-8")))
+
+    def to_bytes(self, start=0, stop=None):
+        """Pack segments start..stop-1 as count, starts, ends, offsets and UTF-8 text"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        base = self.offsets[start]
+        offsets = array("I", (offset - base for offset in self.offsets[start:stop + 1]))
+        return b"".join([
+            struct.pack("<I", stop - start),
+            self.starts[start:stop].tobytes(),
+            self.ends[start:stop].tobytes(),
+            offsets.tobytes(),
+            self.text[base:self.offsets[stop]].encode("utf-8"),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data, language=None, timed=True):
+        """Inverse of to_bytes"""
+        (count,) = struct.unpack_from("<I", data)
+        starts, ends, offsets = array("f"), array("f"), array("I")
+        pos = 4
+        for values, n in ((starts, count), (ends, count), (offsets, count + 1)):
+            size = values.itemsize * n
+            values.frombytes(data[pos:pos + size])
+            pos += size
+        return cls(starts, ends, offsets, data[pos:].decode("utf-8"), language, timed)
+
+    @classmethod
+    def join(cls, parts, language=None, timed=True):
+        """Concatenate several Segments (e.g. stored blocks) into one"""
+        starts, ends, offsets, texts = array("f"), array("f"), array("I", [0]), []
+        for part in parts:
+            base = offsets[-1]
+            starts.extend(part.starts)
+            ends.extend(part.ends)
+            offsets.extend(base + offset for offset in part.offsets[1:])
+            texts.append(part.text)
+        return cls(starts, ends, offsets, "".join(texts), language, timed)
+
+
+class SegmentCache:
+    """Small LRU of Segments keyed by transcript id (the audio content hash)"""
+
+    def __init__(self, max_items=64):
+        self.max_items = max_items
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, transcript_id):
+        with self._lock:
+            segments = self._items.get(transcript_id)
+            if segments is not None:
+                self._items.move_to_end(transcript_id)
+            return segments
+
+    def put(self, transcript_id, segments):
+        with self._lock:
+            self._items[transcript_id] = segments
+            self._items.move_to_end(transcript_id)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def format_timestamp(seconds, separator="."):
+    """00:01:02.345 style timestamp (SRT uses ',' as separator)"""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def iter_paragraphs(segments, max_chars=PARAGRAPH_CHARS, pause=PARAGRAPH_PAUSE):
+    """Group segments into (start seconds, text) paragraphs on pauses or length"""
+    start, parts, length, last_end = None, [], 0, None
+    for seg_start, seg_end, text in segments:
+        new_paragraph = parts and (
+            length + len(text) + 1 > max_chars
+            or (segments.timed and last_end is not None and seg_start - last_end >= pause)
+        )
+        if new_paragraph:
+            yield start, " ".join(parts)
+            start, parts, length = None, [], 0
+        # A single oversized segment is split so no paragraph exceeds max_chars
+        while len(text) > max_chars:
+            yield seg_start, text[:max_chars]
+            text = text[max_chars:]
+        if start is None:
+            start = seg_start
+        parts.append(text)
+        length += len(text) + 1
+        last_end = seg_end
+    if parts:
+        yield start, " ".join(parts)
+
+
+def _real_action_items(action_items):
+    return [item.strip() for item in (action_items or []) if item and item.strip() and item.strip() != NO_ACTION_ITEMS]
+
+
+def _require_timings(segments, fmt):
+    if not segments.timed:
+        raise ValueError(f"{fmt.upper()} export needs segment timestamps, which this transcript does not have")
+
+
+# ---------------------------------------------------------------------------
+# Renderers - each yields the document piece by piece
+# ---------------------------------------------------------------------------
+
+def iter_srt(segments, **meta):
+    _require_timings(segments, "srt")
+    for i, (start, end, text) in enumerate(segments, 1):
+        yield f"{i}\n{format_timestamp(start, ',')} --> {format_timestamp(end, ',')}\n{text}\n\n"
+
+
+def iter_vtt(segments, **meta):
+    _require_timings(segments, "vtt")
+    yield "WEBVTT\n\n"
+    for start, end, text in segments:
+        yield f"{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n"
+
+
+def iter_markdown(segments, title=None, summary=None, action_items=None, footer=None):
+    yield f"# {title or 'Untitled Meeting'}\n\n"
+    if summary:
+        yield f"## Summary\n\n{summary}\n\n"
+    items = _real_action_items(action_items)
+    if items:
+        yield "## Action Items\n\n"
+        for item in items:
+            yield f"- [ ] {item}\n"
+        yield "\n"
+    yield "## Meeting Transcript\n\n"
+    for start, text in iter_paragraphs(segments):
+        if segments.timed:
+            yield f"**[{format_timestamp(start)[:8]}]** {text}\n\n"
+        else:
+            yield f"{text}\n\n"
+    if footer:
+        yield f"---\n{footer}\n"
+
+
+def iter_json(segments, title=None, summary=None, action_items=None):
+    yield "{" + f'"title": {json.dumps(title)}, "language": {json.dumps(segments.language)}, '
+    yield f'"summary": {json.dumps(summary)}, "action_items": {json.dumps(_real_action_items(action_items))}, '
+    yield '"segments": ['
+    for i, (start, end, text) in enumerate(segments):
+        item = {"start": round(start, 2), "end": round(end, 2), "text": text} if segments.timed else {"text": text}
+        yield ("" if i == 0 else ", ") + json.dumps(item)
+    yield "]}\n"
+
+
+class _ChunkSink:
+    """Write-only file object collecting zip output for a streaming generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def _docx_paragraph(text, size=None, bold=False):
+    props = ""
+    if bold or size:
+        props = "<w:rPr>" + ("<w:b/>" if bold else "") + (f'<w:sz w:val="{size}"/>' if size else "") + "</w:rPr>"
+    return f'<w:p><w:r>{props}<w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+
+def iter_docx(segments, title=None, summary=None, action_items=None):
+    """Stream a minimal .docx; the zip is written to a sink and drained as it grows"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        docx.writestr("_rels/.rels", _DOCX_RELS)
+        with docx.open("word/document.xml", "w") as doc:
+            doc.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            )
+            doc.write(_docx_paragraph(title or "Untitled Meeting", size=36, bold=True).encode("utf-8"))
+            if summary:
+                doc.write(_docx_paragraph("Summary", size=28, bold=True).encode("utf-8"))
+                doc.write(_docx_paragraph(summary).encode("utf-8"))
+            items = _real_action_items(action_items)
+            if items:
+                doc.write(_docx_paragraph("Action Items", size=28, bold=True).encode("utf-8"))
+                for item in items:
+                    doc.write(_docx_paragraph(f"☐ {item}").encode("utf-8"))
+            doc.write(_docx_paragraph("Meeting Transcript", size=28, bold=True).encode("utf-8"))
+            for start, text in iter_paragraphs(segments):
+                if segments.timed:
+                    text = f"[{format_timestamp(start)[:8]}] {text}"
+                doc.write(_docx_paragraph(text).encode("utf-8"))
+                yield from sink.drain()
+            doc.write(b"<w:sectPr/></w:body></w:document>")
+    yield from sink.drain()
+
+
+def _notion_text(content):
+    return [{"type": "text", "text": {"content": content}}]
+
+
+def _notion_block(block_type, content, **extra):
+    return {"object": "block", "type": block_type, block_type: {"rich_text": _notion_text(content), **extra}}
+
+
+def iter_notion_blocks(segments, summary=None, action_items=None):
+    """Yield the top-level Notion blocks for a meeting page, transcript last.
+
+    Transcript paragraphs are not nested here; see create_notion_page, which
+    appends them to a toggle in batches.
+    """
+    if summary:
+        yield _notion_block("heading_2", "📋 Meeting Summary")
+        for i in range(0, len(summary), NOTION_TEXT_LIMIT):
+            yield _notion_block("paragraph", summary[i:i + NOTION_TEXT_LIMIT])
+    items = _real_action_items(action_items)
+    if items:
+        yield _notion_block("heading_2", "✅ Action Items")
+        for item in items:
+            yield _notion_block("to_do", item[:NOTION_TEXT_LIMIT], checked=False)
+    if len(segments):
+        yield _notion_block("heading_2", "📝 Full Transcript")
+
+
+def iter_notion_transcript(segments):
+    """Yield paragraph blocks of the transcript, each under Notion's text limit"""
+    for _, text in iter_paragraphs(segments, max_chars=NOTION_TEXT_LIMIT):
+        yield _notion_block("paragraph", text)
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def create_notion_page(client, database_id, title, segments, summary=None, action_items=None):
+    """Create a meeting page, batching blocks to respect Notion's request limits"""
+    batches = _batches(iter_notion_blocks(segments, summary, action_items), NOTION_BATCH_SIZE)
+    page = client.pages.create(
+        parent={"database_id": database_id},
+        properties={"Name": {"title": [{"text": {"content": f"Meeting Notes - {title}"}}]}},
+        children=next(batches, [])
+    )
+    for batch in batches:
+        client.blocks.children.append(block_id=page["id"], children=batch)
+    if len(segments):
+        # Full transcript (collapsed), filled in batches of paragraphs
+        toggle = client.blocks.children.append(
+            block_id=page["id"], children=[_notion_block("toggle", "Click to expand")]
+        )["results"][0]
+        for batch in _batches(iter_notion_transcript(segments), NOTION_BATCH_SIZE):
+            client.blocks.children.append(block_id=toggle["id"], children=batch)
+    return page
+
+
+EXPORT_FORMATS = {
+    "srt": ("application/x-subrip", "srt", iter_srt),
+    "vtt": ("text/vtt", "vtt", iter_vtt),
+    "md": ("text/markdown", "md", iter_markdown),
+    "docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx", iter_docx),
+    "json": ("application/json", "json", iter_json),
+}
@@ -0,0 +1,149 @@
+import collections
+import os
+import threading
+import time
+
+import numpy as np
+
+# Language identification for the Whisper services
+# Whisper normally detects the language from the first 30 s of each file (or
+# of each chunk), which is often silence or small talk. Here the encoder runs
+# once on the 30 s window with the most speech energy, the result comes with
+# a confidence, and confident results are remembered per session so later
+# uploads from the same meeting/user skip detection and go straight to the
+# decoder with the language fixed.
+
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30  # Whisper's encoder context
+FRAME_SECONDS = 0.5
+CONFIDENT = float(os.getenv("LANGUAGE_CONFIDENCE", 0.8))  # skip detection above this
+SESSION_TTL = float(os.getenv("LANGUAGE_SESSION_TTL", 24 * 3600))
+MAX_SESSIONS = 1000
+
+
+def speech_window(audio, seconds=WINDOW_SECONDS, sample_rate=SAMPLE_RATE):
+    """The `seconds`-long slice of `audio` carrying the most speech energy.
+
+    Frames are scored by RMS energy and gated by a simple energy VAD (frames
+    near the noise floor score zero), so long pauses and room noise at the
+    start of a recording don't decide the language.
+    """
+    window = int(seconds * sample_rate)
+    if len(audio) <= window:
+        return audio
+    frame = int(FRAME_SECONDS * sample_rate)
+    frames = len(audio) // frame
+    rms = np.sqrt((audio[:frames * frame].reshape(frames, frame) ** 2).mean(axis=1))
+    noise_floor = np.percentile(rms, 10)
+    voiced = np.where(rms > 2 * noise_floor + 1e-4, rms, 0.0)
+    # Sliding sum of voiced energy over every window-sized run of frames
+    width = window // frame
+    sums = np.convolve(voiced, np.ones(width), mode="valid")
+    start = int(np.argmax(sums)) * frame
+    return audio[start:start + window]
+
+
+def whisper_detector(model):
+    """Detector for openai-whisper: one encoder pass plus one decoder step"""
+    import whisper
+
+    def detect(audio):
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels).to(model.device)
+        _, probs = model.detect_language(mel)
+        language = max(probs, key=probs.get)
+        return language, float(probs[language])
+    return detect
+
+
+def faster_whisper_detector(model):
+    """Detector for faster-whisper.
+
+    transcribe() encodes the first window and detects the language eagerly but
+    decodes lazily, so not iterating the segments costs only the detection.
+    """
+    def detect(audio):
+        _, info = model.transcribe(audio, language=None, beam_size=1, without_timestamps=True)
+        return info.language, float(info.language_probability)
+    return detect
+
+
+class LanguageCache:
+    """Most recent confident language per session, with a TTL"""
+
+    def __init__(self, max_items=MAX_SESSIONS, ttl=SESSION_TTL):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session):
+        with self._lock:
+            entry = self._items.get(session)
+            if entry is None:
+                return None
+            if time.time() - entry[2] > self.ttl:
+                del self._items[session]
+                return None
+            self._items.move_to_end(session)
+            return entry[0], entry[1]
+
+    def put(self, session, language, confidence):
+        with self._lock:
+            self._items[session] = (language, confidence, time.time())
+            self._items.move_to_end(session)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class LanguageIdentifier:
+    """Picks the decoding language: explicit hint, confident session cache, or detection"""
+
+    def __init__(self, detect_fn=None, threshold=CONFIDENT, cache=None):
+        self.detect_fn = detect_fn
+        self.threshold = threshold
+        self.cache = cache or LanguageCache()
+        self.detections = 0
+        self.skipped = 0
+
+    def identify(self, audio, session=None, hint=None):
+        """Returns {"language", "confidence", "source"}.
+
+        `hint` is a language the client asked for and always wins. Otherwise a
+        session's cached language is reused when its confidence is above the
+        threshold; if not, detection runs on the loudest speech window and a
+        confident result is cached for the session.
+        """
+        if hint:
+            return {"language": hint, "confidence": 1.0, "source": "request"}
+        if session:
+            cached = self.cache.get(session)
+            if cached and cached[1] >= self.threshold:
+                self.skipped += 1
+                return {"language": cached[0], "confidence": round(cached[1], 3), "source": "session"}
+        if self.detect_fn is None or len(audio) == 0:
+            return {"language": None, "confidence": 0.0, "source": "none"}
+        language, confidence = self.detect_fn(speech_window(audio))
+        self.detections += 1
+        if session and confidence >= self.threshold:
+            self.cache.put(session, language, confidence)
+        return {"language": language, "confidence": round(confidence, 3), "source": "detected"}
+
+    def stats(self):
+        return {
+            "threshold": self.threshold,
+            "sessions": len(self.cache),
+            "detections": self.detections,
+            "skipped": self.skipped,
+        }
+
+
+def session_key(headers, form):
+    """Session/user id for the language cache: X-Session-Id header or session_id/user form field"""
+    return headers.get("X-Session-Id") or form.get("session_id") or form.get("user") or None
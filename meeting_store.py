@@ -0,0 +1,209 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from exporters import Segments
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Local meeting store
+# Each meeting (keyed by its transcript id, the audio content hash) is kept
+# in SQLite: one row of metadata -- title, language, summary, action items --
+# plus the transcript segments packed into blocks of BLOCK_SEGMENTS and
+# compressed with zstd (zlib when zstandard isn't installed; the codec is
+# recorded per block). Clients pass the meeting id instead of re-sending the
+# transcript, and long transcripts are read a page of blocks at a time.
+
+BLOCK_SEGMENTS = 256
+ZSTD_LEVEL = 6
+RETENTION_DAYS = 30  # meetings untouched for longer are deleted
+MAX_MEETINGS = 1000  # beyond this the least recently updated are deleted
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meetings (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    language TEXT,
+    summary TEXT,
+    action_items TEXT,
+    segment_count INTEGER NOT NULL DEFAULT 0,
+    duration REAL,
+    timed INTEGER NOT NULL DEFAULT 1,
+    raw_bytes INTEGER NOT NULL DEFAULT 0,
+    stored_bytes INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segment_blocks (
+    meeting_id TEXT NOT NULL REFERENCES meetings(id) ON DELETE CASCADE,
+    first_segment INTEGER NOT NULL,
+    segment_count INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (meeting_id, first_segment)
+);
+CREATE INDEX IF NOT EXISTS meetings_updated ON meetings(updated_at);
+"""
+
+
+def compress(data):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+
+def decompress(codec, data):
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Meeting was stored with zstd; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown codec '{codec}'")
+
+
+class MeetingStore:
+    """SQLite-backed store of meetings and their compressed transcript segments"""
+
+    def __init__(self, path, block_segments=BLOCK_SEGMENTS, retention_days=RETENTION_DAYS, max_meetings=MAX_MEETINGS):
+        self.path = path
+        self.block_segments = block_segments
+        self.retention_days = retention_days
+        self.max_meetings = max_meetings
+        self.purged = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+        self.purge()
+
+    # -- writing ----------------------------------------------------------
+
+    def save(self, meeting_id, segments, title=None, summary=None, action_items=None):
+        """Store (or replace) a meeting's segments; metadata given here is stored too"""
+        now = time.time()
+        blocks, raw_bytes, stored_bytes = [], 0, 0
+        for first in range(0, len(segments), self.block_segments):
+            raw = segments.to_bytes(first, first + self.block_segments)
+            codec, data = compress(raw)
+            count = min(self.block_segments, len(segments) - first)
+            blocks.append((meeting_id, first, count, codec, data))
+            raw_bytes += len(raw)
+            stored_bytes += len(data)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meetings (id, title, language, segment_count, duration, timed, raw_bytes, stored_bytes,"
+                " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET title = COALESCE(excluded.title, title), language = excluded.language,"
+                " segment_count = excluded.segment_count, duration = excluded.duration, timed = excluded.timed,"
+                " raw_bytes = excluded.raw_bytes, stored_bytes = excluded.stored_bytes, updated_at = excluded.updated_at",
+                (meeting_id, title, segments.language, len(segments), segments.duration(), int(segments.timed),
+                 raw_bytes, stored_bytes, now, now))
+            self._conn.execute("DELETE FROM segment_blocks WHERE meeting_id = ?", (meeting_id,))
+            self._conn.executemany(
+                "INSERT INTO segment_blocks (meeting_id, first_segment, segment_count, codec, data) VALUES (?, ?, ?, ?, ?)",
+                blocks)
+        if summary is not None or action_items is not None:
+            self.update(meeting_id, summary=summary, action_items=action_items)
+        self.purge()
+
+    def update(self, meeting_id, title=None, summary=None, action_items=None):
+        """Set the given metadata fields; returns False for an unknown meeting"""
+        fields = {"title": title, "summary": summary,
+                  "action_items": json.dumps(action_items) if action_items is not None else None}
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if not fields:
+            return self.exists(meeting_id)
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"UPDATE meetings SET {assignments}, updated_at = ? WHERE id = ?",
+                (*fields.values(), time.time(), meeting_id))
+        return cursor.rowcount > 0
+
+    def purge(self):
+        """Apply the retention limits: drop meetings past retention_days, then the
+        least recently updated ones beyond max_meetings"""
+        with self._lock, self._conn:
+            deleted = 0
+            if self.retention_days:
+                cutoff = time.time() - self.retention_days * 86400
+                deleted += self._conn.execute("DELETE FROM meetings WHERE updated_at < ?", (cutoff,)).rowcount
+            if self.max_meetings:
+                deleted += self._conn.execute(
+                    "DELETE FROM meetings WHERE id NOT IN"
+                    " (SELECT id FROM meetings ORDER BY updated_at DESC LIMIT ?)", (self.max_meetings,)).rowcount
+        self.purged += deleted
+        return deleted
+
+    def delete(self, meeting_id):
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM meetings WHERE id = ?", (meeting_id,)).rowcount > 0
+
+    # -- reading ----------------------------------------------------------
+
+    def exists(self, meeting_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM meetings WHERE id = ?", (meeting_id,)).fetchone() is not None
+
+    def get(self, meeting_id):
+        """Meeting metadata (no transcript), or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM meetings WHERE id = ?", (meeting_id,)).fetchone()
+        return _meeting_dict(row) if row else None
+
+    def load_segments(self, meeting_id):
+        """All of a meeting's segments as one Segments, or None"""
+        meeting = self.get(meeting_id)
+        if meeting is None:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT codec, data FROM segment_blocks WHERE meeting_id = ? ORDER BY first_segment",
+                (meeting_id,)).fetchall()
+        parts = (Segments.from_bytes(decompress(row["codec"], row["data"])) for row in rows)
+        return Segments.join(parts, meeting["language"], meeting["timed"])
+
+    def read_segments(self, meeting_id, offset=0, limit=100):
+        """Segments offset..offset+limit-1 as (start, end, text), decompressing only the blocks they span"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT first_segment, codec, data FROM segment_blocks WHERE meeting_id = ?"
+                " AND first_segment + segment_count > ? AND first_segment < ? ORDER BY first_segment",
+                (meeting_id, offset, offset + limit)).fetchall()
+        segments = []
+        for row in rows:
+            block = Segments.from_bytes(decompress(row["codec"], row["data"]))
+            first = row["first_segment"]
+            segments.extend(block.slice(offset - first, offset + limit - first))
+        return segments
+
+    def stats(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(stored_bytes), 0) FROM meetings").fetchone()
+        return {
+            "path": self.path,
+            "codec": "zstd" if zstandard is not None else "zlib",
+            "meetings": row[0],
+            "raw_bytes": row[1],
+            "stored_bytes": row[2],
+            "retention_days": self.retention_days,
+            "max_meetings": self.max_meetings,
+            "purged": self.purged,
+        }
+
+
+def _meeting_dict(row):
+    meeting = dict(row)
+    meeting["action_items"] = json.loads(meeting["action_items"]) if meeting["action_items"] else None
+    meeting["timed"] = bool(meeting["timed"])
+    return meeting
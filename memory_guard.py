@@ -0,0 +1,315 @@
+import collections
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Memory-pressure guard for the Whisper services
+# Samples process RSS and cgroup memory, keeps per-request peak RSS and
+# (optionally) the top allocation sites, and reacts before the kernel's OOM
+# killer does: above the soft limit caches are freed and new work waits,
+# above the hard limit new work is shed with a Retry-After.
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_INTERVAL", 0.5))
+SOFT_LIMIT = float(os.getenv("MEMORY_SOFT_LIMIT", 0.80))  # fraction of the limit
+HARD_LIMIT = float(os.getenv("MEMORY_HARD_LIMIT", 0.90))
+PROFILER = os.getenv("MEMORY_PROFILER", "")  # "", "tracemalloc" or "torch"
+TOP_ALLOCATIONS = 10
+RECENT_PROFILES = 20
+FREE_COOLDOWN = 10.0  # seconds between background cache frees
+
+# Rough footprint of a job per second of audio: decoded float32 samples
+# plus the padded/resampled and mel copies made during inference
+AUDIO_BYTES_PER_SECOND = 16000 * 4 * 3
+
+# cgroup v1 reports "no limit" as a huge page-aligned number
+_UNLIMITED = 1 << 60
+
+
+class MemoryPressure(Exception):
+    """Raised when new work is shed because memory is close to the limit"""
+
+    status = 503
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_job_bytes(audio_seconds):
+    return int(audio_seconds * AUDIO_BYTES_PER_SECOND)
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+        return None if value == "max" else int(value)
+    except (OSError, ValueError):
+        return None
+
+
+def process_memory():
+    """Current and peak RSS of this process, in bytes"""
+    rss = peak = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        rss = peak
+    return {"rss": rss, "peak_rss": peak}
+
+
+def cgroup_memory():
+    """Usage, working set and limit of the container's memory cgroup, in bytes"""
+    usage = _read_int("/sys/fs/cgroup/memory.current")
+    if usage is not None:
+        limit = _read_int("/sys/fs/cgroup/memory.max")
+        stat_path, inactive_key = "/sys/fs/cgroup/memory.stat", "inactive_file"
+    else:
+        usage = _read_int("/sys/fs/cgroup/memory/memory.usage_in_bytes")
+        limit = _read_int("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+        stat_path, inactive_key = "/sys/fs/cgroup/memory/memory.stat", "total_inactive_file"
+    if usage is None:
+        return None
+    if limit is not None and limit >= _UNLIMITED:
+        limit = None
+    # Reclaimable page cache doesn't count towards an OOM kill
+    inactive = 0
+    try:
+        with open(stat_path) as f:
+            for line in f:
+                key, value = line.split()
+                if key == inactive_key:
+                    inactive = int(value)
+                    break
+    except (OSError, ValueError):
+        pass
+    return {"usage": usage, "working_set": max(0, usage - inactive), "limit": limit}
+
+
+def system_memory_total():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _malloc_trim():
+    """Hand freed heap pages back to the OS (glibc only)"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        libc.malloc_trim(0)
+    except (OSError, AttributeError, TypeError):
+        pass
+
+
+class MemoryGuard:
+    """Watches memory against the container limit and sheds or queues work near it"""
+
+    def __init__(self, limit=None, soft_limit=SOFT_LIMIT, hard_limit=HARD_LIMIT, profiler=PROFILER):
+        cgroup = cgroup_memory()
+        env_limit = os.getenv("MEMORY_LIMIT_MB")
+        if limit is None and env_limit:
+            limit = int(env_limit) * 1024 * 1024
+        if limit is None and cgroup and cgroup["limit"]:
+            limit = cgroup["limit"]
+        self.limit = limit or system_memory_total()
+        self.soft_limit = soft_limit
+        self.hard_limit = hard_limit
+        self.profiler = profiler
+        self.shed = 0
+        self.cache_frees = 0
+        self._last_free = 0.0
+        self.last_sample = {}
+        self.peak_usage = 0
+        self._caches = {}
+        self._active = {}
+        self._profiles = collections.deque(maxlen=RECENT_PROFILES)
+        self._lock = threading.Lock()
+        # torch allows one active profiler per process; concurrent requests skip it
+        self._torch_profiler_lock = threading.Lock()
+        self._thread = None
+        if profiler == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+    # -- sampling ---------------------------------------------------------
+
+    def usage(self):
+        """Bytes counted against the limit: the larger of RSS and the cgroup working set"""
+        proc = process_memory()
+        cgroup = cgroup_memory()
+        used = max(proc["rss"] or 0, cgroup["working_set"] if cgroup else 0)
+        self.last_sample = {"time": time.time(), "process": proc, "cgroup": cgroup, "used": used}
+        self.peak_usage = max(self.peak_usage, used)
+        with self._lock:
+            for profile in self._active.values():
+                profile["peak_rss"] = max(profile["peak_rss"], proc["rss"] or 0)
+        return used
+
+    def pressure(self):
+        """Fraction of the limit in use (0 when the limit is unknown)"""
+        if not self.limit:
+            return 0.0
+        return self.usage() / self.limit
+
+    def start(self):
+        """Start the background sampler that frees caches above the soft limit"""
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._sample_loop, name="memory-guard", daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample_loop(self):
+        while True:
+            try:
+                if self.pressure() >= self.soft_limit and time.time() - self._last_free > FREE_COOLDOWN:
+                    self.free_caches()
+            except Exception as e:
+                logger.warning(f"Memory sampling failed: {e}")
+            time.sleep(SAMPLE_INTERVAL)
+
+    # -- relieving pressure -----------------------------------------------
+
+    def register_cache(self, name, clear_fn):
+        """Register a callable that drops a cache when memory runs short"""
+        self._caches[name] = clear_fn
+
+    def free_caches(self):
+        before = self.usage()
+        for name, clear_fn in list(self._caches.items()):
+            try:
+                clear_fn()
+            except Exception as e:
+                logger.warning(f"Clearing cache '{name}' failed: {e}")
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        _malloc_trim()
+        self.cache_frees += 1
+        self._last_free = time.time()
+        freed = before - self.usage()
+        logger.info(f"Freed caches under memory pressure: {freed / 1048576:.1f} MB released")
+        return freed
+
+    def check(self, extra_bytes=0):
+        """Shed new work that would push usage past the hard limit.
+
+        `extra_bytes` is the expected footprint of the job being admitted.
+        Caches are freed first; MemoryPressure is raised if that isn't enough.
+        """
+        if not self.limit:
+            return
+        if (self.usage() + extra_bytes) / self.limit < self.hard_limit:
+            return
+        self.free_caches()
+        used = self.usage()
+        if (used + extra_bytes) / self.limit >= self.hard_limit:
+            self.shed += 1
+            raise MemoryPressure(
+                f"Server is low on memory ({used / 1048576:.0f} of {self.limit / 1048576:.0f} MB in use), "
+                f"please retry shortly")
+
+    def can_start(self):
+        """False while above the soft limit; used to hold queued jobs back"""
+        return not self.limit or self.pressure() < self.soft_limit
+
+    # -- per-request profiling --------------------------------------------
+
+    @contextmanager
+    def profile(self, name):
+        """Record peak RSS (and top allocation sites when profiling) for a block"""
+        rss = process_memory()["rss"] or 0
+        profile = {"name": name, "started_at": time.time(), "start_rss": rss, "peak_rss": rss}
+        key = object()
+        snapshot = torch_profiler = None
+        with self._lock:
+            self._active[key] = profile
+        try:
+            if self.profiler == "tracemalloc" and tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+            torch_profiler = self._start_torch_profiler()
+            yield profile
+        finally:
+            with self._lock:
+                self._active.pop(key, None)
+            end_rss = process_memory()["rss"] or 0
+            profile["peak_rss"] = max(profile["peak_rss"], end_rss)
+            profile["end_rss"] = end_rss
+            profile["peak_delta_mb"] = round((profile["peak_rss"] - profile["start_rss"]) / 1048576, 1)
+            profile["seconds"] = round(time.time() - profile["started_at"], 3)
+            if snapshot is not None:
+                stats = tracemalloc.take_snapshot().compare_to(snapshot, "lineno")[:TOP_ALLOCATIONS]
+                profile["top_allocations"] = [
+                    {"site": str(stat.traceback[0]), "size_diff_kb": round(stat.size_diff / 1024, 1), "count_diff": stat.count_diff}
+                    for stat in stats
+                ]
+            if torch_profiler is not None:
+                try:
+                    torch_profiler.__exit__(None, None, None)
+                    profile["torch_top_ops"] = [
+                        {"op": e.key, "self_cpu_memory_kb": round(e.self_cpu_memory_usage / 1024, 1)}
+                        for e in sorted(torch_profiler.key_averages(), key=lambda e: e.self_cpu_memory_usage, reverse=True)[:TOP_ALLOCATIONS]
+                    ]
+                finally:
+                    self._torch_profiler_lock.release()
+            self._profiles.append(profile)
+
+    def _start_torch_profiler(self):
+        """Start a torch memory profiler, or None when disabled or another request holds it"""
+        if self.profiler != "torch" or "torch" not in sys.modules:
+            return None
+        if not self._torch_profiler_lock.acquire(blocking=False):
+            return None
+        torch = sys.modules["torch"]
+        try:
+            prof = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], profile_memory=True)
+            prof.__enter__()
+        except Exception as e:
+            self._torch_profiler_lock.release()
+            logger.warning(f"Could not start torch profiler: {e}")
+            return None
+        return prof
+
+    # -- reporting --------------------------------------------------------
+
+    def report(self):
+        used = self.usage()
+        mb = lambda b: round(b / 1048576, 1) if b is not None else None
+        sample = self.last_sample
+        cgroup = sample.get("cgroup")
+        return {
+            "used_mb": mb(used),
+            "limit_mb": mb(self.limit),
+            "pressure": round(used / self.limit, 3) if self.limit else None,
+            "soft_limit": self.soft_limit,
+            "hard_limit": self.hard_limit,
+            "peak_used_mb": mb(self.peak_usage),
+            "process": {"rss_mb": mb(sample["process"]["rss"]), "peak_rss_mb": mb(sample["process"]["peak_rss"])},
+            "cgroup": {k: mb(v) for k, v in cgroup.items()} if cgroup else None,
+            "profiler": self.profiler or None,
+            "caches": sorted(self._caches),
+            "cache_frees": self.cache_frees,
+            "shed": self.shed,
+            "recent_requests": list(self._profiles),
+        }
@@ -0,0 +1,281 @@
+import logging
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Overlapped processing pipeline for /process
+# Each stage (decode -> ASR -> summarize/extract -> export) runs in its own
+# single-worker executor and hands work to the next stage through a bounded
+# queue, so summarizing chunk N overlaps with transcribing chunk N+1 and the
+# total turnaround tends towards the slowest stage instead of the sum.
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 30
+QUEUE_SIZE = 2
+MAX_FINISHED_JOBS = 50
+
+_END = object()
+
+
+def iter_audio_chunks(path, chunk_seconds=CHUNK_SECONDS, ffmpeg_threads=0):
+    """Stream-decode an audio file with ffmpeg and yield (offset, samples) chunks.
+
+    Chunks are yielded as soon as ffmpeg has produced enough PCM, so the ASR
+    stage can start on the first chunk while the rest is still decoding.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", str(ffmpeg_threads),
+        "-i", path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE),
+        "-loglevel", "error", "-",
+    ]
+    chunk_bytes = int(chunk_seconds * SAMPLE_RATE) * 2
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    offset = 0.0
+    try:
+        while True:
+            data = proc.stdout.read(chunk_bytes)
+            if not data:
+                break
+            samples = np.frombuffer(data, np.int16).flatten().astype(np.float32) / 32768.0
+            yield offset, samples
+            offset += len(samples) / SAMPLE_RATE
+        proc.wait()
+        if proc.returncode != 0:
+            raise RuntimeError(f"Failed to decode audio: {proc.stderr.read().decode(errors='ignore')}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def load_audio(path, ffmpeg_threads=0):
+    """Decode a whole file to 16 kHz mono float32, like whisper.load_audio but with a thread cap"""
+    chunks = [samples for _, samples in iter_audio_chunks(path, 600, ffmpeg_threads)]
+    return np.concatenate(chunks) if chunks else np.zeros(0, np.float32)
+
+
+class Stage:
+    """One pipeline stage: a function applied to every item in its own executor.
+
+    `fn(item)` returns the item handed to the next stage (or None to drop it).
+    `finish()` is called once after the last item and its return value, if
+    not None, is passed downstream as a final item.
+    """
+
+    def __init__(self, name, fn, finish=None):
+        self.name = name
+        self.fn = fn
+        self.finish = finish
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.inbox = None
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "processed": self.processed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            # Time spent waiting for room in the next stage's queue
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "queue_depth": self.inbox.qsize() if self.inbox is not None else 0,
+        }
+
+
+class Pipeline:
+    """Run a source generator through a chain of stages connected by bounded queues."""
+
+    def __init__(self, name, source, stages, queue_size=QUEUE_SIZE):
+        self.name = name
+        self.source = source
+        self.source_stats = Stage("decode", None)
+        self.stages = stages
+        self.queue_size = queue_size
+        self.error = None
+        self._cancelled = threading.Event()
+
+    def _put(self, stage, q, item):
+        start = time.time()
+        while not self._cancelled.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        stage.blocked_seconds += time.time() - start
+
+    def _run_source(self, out):
+        stage = self.source_stats
+        try:
+            iterator = iter(self.source())
+            while not self._cancelled.is_set():
+                start = time.time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stage.busy_seconds += time.time() - start
+                stage.processed += 1
+                self._put(stage, out, item)
+        except Exception as e:
+            self._fail(stage, e)
+        finally:
+            self._put(stage, out, _END)
+
+    def _run_stage(self, stage, out):
+        while not self._cancelled.is_set():
+            try:
+                item = stage.inbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is _END:
+                break
+            start = time.time()
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                self._fail(stage, e)
+                break
+            stage.busy_seconds += time.time() - start
+            stage.processed += 1
+            if result is not None and out is not None:
+                self._put(stage, out, result)
+        if stage.finish is not None and not self._cancelled.is_set():
+            try:
+                result = stage.finish()
+                if result is not None and out is not None:
+                    self._put(stage, out, result)
+            except Exception as e:
+                self._fail(stage, e)
+        if out is not None:
+            self._put(stage, out, _END)
+
+    def _fail(self, stage, error):
+        logger.error(f"Pipeline {self.name} failed in stage '{stage.name}': {error}")
+        if self.error is None:
+            self.error = f"{stage.name}: {error}"
+        self._cancelled.set()
+
+    def run(self):
+        """Run the pipeline to completion; raises RuntimeError if any stage failed."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        for stage, q in zip(self.stages, queues):
+            stage.inbox = q
+        executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.name}-decode")]
+        executors += [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.name}-{s.name}") for s in self.stages]
+        try:
+            futures = [executors[0].submit(self._run_source, queues[0])]
+            for i, stage in enumerate(self.stages):
+                out = queues[i + 1] if i + 1 < len(queues) else None
+                futures.append(executors[i + 1].submit(self._run_stage, stage, out))
+            for future in futures:
+                future.result()
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=False)
+        if self.error:
+            raise RuntimeError(self.error)
+
+    def stats(self):
+        return [self.source_stats.stats()] + [stage.stats() for stage in self.stages]
+
+
+class ProcessJob:
+    """Book-keeping for one /process request"""
+
+    def __init__(self, title=None):
+        self.id = uuid.uuid4().hex
+        self.title = title
+        self.status = "queued"
+        self.error = None
+        self.result = None
+        self.pipeline = None
+        self.chunks_total = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        stages = self.pipeline.stats() if self.pipeline is not None else []
+        last = stages[-1]["processed"] if stages else 0
+        progress = None
+        if self.chunks_total:
+            progress = round(min(1.0, last / self.chunks_total), 3)
+        elif self.status == "done":
+            progress = 1.0
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        data = {
+            "job_id": self.id,
+            "title": self.title,
+            "status": self.status,
+            "progress": progress,
+            "chunks_total": self.chunks_total,
+            "elapsed_seconds": elapsed,
+            "stages": stages,
+        }
+        if self.error:
+            data["error"] = self.error
+        if self.result is not None:
+            data["result"] = self.result
+        return data
+
+
+class JobRegistry:
+    """Thread-safe store of recent /process jobs; drops the oldest finished ones."""
+
+    def __init__(self, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = sorted((j for j in self._jobs.values() if j.done.is_set()), key=lambda j: j.created_at)
+            for old in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[old.id]
+
+    def clear_finished(self):
+        """Forget all finished jobs (and their results)"""
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.done.is_set()]:
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+def run_job(job, pipeline, on_done=None):
+    """Run `pipeline` on behalf of `job`, recording status and timings."""
+    job.pipeline = pipeline
+    job.status = "running"
+    job.started_at = time.time()
+    try:
+        pipeline.run()
+        job.status = "done"
+    except Exception as e:
+        job.status = "error"
+        job.error = str(e)
+    finally:
+        job.finished_at = time.time()
+        if on_done is not None:
+            try:
+                on_done(job)
+            except Exception as e:
+                logger.error(f"Job {job.id} cleanup failed: {e}")
+        job.done.set()
+    return job
@@ -0,0 +1,77 @@
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController
+
+
+def run_ticket(ticket, hold, order, name):
+    with ticket:
+        order.append(name)
+        time.sleep(hold)
+
+
+def daemon_pool(workers):
+    """Minimal thread pool (daemon threads, so a deadlock fails the test instead of hanging it)"""
+    jobs = queue.Queue()
+
+    def work():
+        for fn, args, done in iter(jobs.get, None):
+            fn(*args)
+            done.set()
+
+    for _ in range(workers):
+        threading.Thread(target=work, daemon=True).start()
+
+    def submit(fn, *args):
+        done = threading.Event()
+        jobs.put((fn, args, done))
+        return done
+    return submit
+
+
+def test_ticket_waiting_in_executor_queue_does_not_block_others():
+    # Every pool thread is blocked waiting for the slot (held by a request
+    # outside the pool) while a shorter job sits in the pool's queue with no
+    # thread waiting on its ticket. Once the slot frees up, the waiting
+    # threads must still run rather than defer to that ticket forever.
+    controller = AdmissionController(slots=1, max_job_seconds=100, max_backlog_seconds=1000)
+    submit = daemon_pool(2)
+    order = []
+    blocker = controller.submit(1)
+    blocker.__enter__()
+    jobs = [submit(run_ticket, controller.submit(cost), 0.05, order, name)
+            for name, cost in [("long-1", 50), ("long-2", 40)]]
+    time.sleep(0.2)  # both pool threads are now inside `with ticket`
+    jobs.append(submit(run_ticket, controller.submit(1), 0.05, order, "short"))
+    blocker.__exit__(None, None, None)
+    deadline = time.time() + 10
+    assert all(job.wait(max(0, deadline - time.time())) for job in jobs), \
+        f"admission deadlocked: {controller.stats()}"
+    assert sorted(order) == ["long-1", "long-2", "short"]
+    stats = controller.stats()
+    assert stats["running"] == 0 and stats["queued"] == 0
+
+
+def test_shortest_waiting_job_goes_first():
+    controller = AdmissionController(slots=1, max_job_seconds=100, max_backlog_seconds=1000)
+    order = []
+    blocker = controller.submit(1)
+    blocker.__enter__()
+    threads = []
+    for name, cost in [("long", 50), ("short", 5)]:
+        ticket = controller.submit(cost)
+        thread = threading.Thread(target=run_ticket, args=(ticket, 0, order, name))
+        thread.start()
+        threads.append(thread)
+    # Let both threads reach the queue before the slot frees up
+    while len(controller._waiting) < 2:
+        time.sleep(0.01)
+    blocker.__exit__(None, None, None)
+    for thread in threads:
+        thread.join(timeout=10)
+    assert order == ["short", "long"]
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exporters import Segments
+from meeting_store import MeetingStore
+
+
+def make_segments(count, language="en"):
+    return Segments.from_whisper(
+        ({"start": i * 2.0, "end": i * 2.0 + 1.5, "text": f"Sentence {i} ünïcode."} for i in range(count)),
+        language,
+    )
+
+
+def test_save_and_load_round_trip(tmp_path):
+    store = MeetingStore(str(tmp_path / "meetings.db"), block_segments=16)
+    segments = make_segments(50)
+    store.save("m1", segments, title="Standup", summary="Short", action_items=["Ship it"])
+
+    meeting = store.get("m1")
+    assert meeting["title"] == "Standup"
+    assert meeting["language"] == "en"
+    assert meeting["summary"] == "Short"
+    assert meeting["action_items"] == ["Ship it"]
+    assert meeting["segment_count"] == 50
+    assert meeting["timed"] is True
+
+    loaded = store.load_segments("m1")
+    assert list(loaded) == list(segments)
+    assert loaded.full_text() == segments.full_text()
+    assert store.get("missing") is None
+    assert store.load_segments("missing") is None
+
+
+def test_save_keeps_title_and_untimed_segments(tmp_path):
+    store = MeetingStore(str(tmp_path / "meetings.db"))
+    store.save("m1", make_segments(3), title="Planning")
+    store.save("m1", make_segments(4))
+    assert store.get("m1")["title"] == "Planning"
+    assert store.get("m1")["segment_count"] == 4
+
+    store.save("t", Segments.from_text("Hi there. How are you?"))
+    loaded = store.load_segments("t")
+    assert loaded.timed is False
+    assert [text for _, _, text in loaded] == ["Hi there.", "How are you?"]
+
+    store.save("empty", make_segments(0))
+    assert len(store.load_segments("empty")) == 0
+    assert store.read_segments("empty") == []
+
+
+def test_read_segments_pages_across_block_edges(tmp_path):
+    store = MeetingStore(str(tmp_path / "meetings.db"), block_segments=16)
+    segments = make_segments(50)
+    store.save("m1", segments)
+    expected = list(segments)
+
+    for offset, limit in [(0, 16), (10, 12), (15, 2), (16, 16), (30, 40), (48, 10), (0, 50)]:
+        assert store.read_segments("m1", offset, limit) == expected[offset:offset + limit]
+    assert store.read_segments("m1", 50, 10) == []
+    assert store.read_segments("missing", 0, 10) == []
+
+
+def test_purge_applies_count_and_age_limits(tmp_path):
+    store = MeetingStore(str(tmp_path / "meetings.db"), block_segments=4, retention_days=1, max_meetings=3)
+    for i in range(5):
+        store.save(f"m{i}", make_segments(10))
+        time.sleep(0.01)
+    # Only the three most recently updated meetings survive
+    assert [store.exists(f"m{i}") for i in range(5)] == [False, False, True, True, True]
+
+    store._conn.execute("UPDATE meetings SET updated_at = 0 WHERE id = 'm4'")
+    store._conn.commit()
+    assert store.purge() == 1
+    assert not store.exists("m4")
+    # Segment blocks go with their meeting
+    blocks = store._conn.execute("SELECT COUNT(*) FROM segment_blocks").fetchone()[0]
+    assert blocks == 2 * 3
+    assert store.stats()["purged"] == 3
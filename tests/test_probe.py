@@ -0,0 +1,90 @@
+import os
+import random
+import struct
+import sys
+import wave
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admission
+from admission import probe_duration
+
+
+@pytest.fixture(autouse=True)
+def no_ffprobe(monkeypatch):
+    # Only the header probes are under test; keep results independent of ffprobe
+    monkeypatch.setattr(admission, "_probe_ffprobe", lambda path: None)
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def box(box_type, body):
+    return struct.pack(">I", 8 + len(body)) + box_type + body
+
+
+def test_wav(tmp_path):
+    path = str(tmp_path / "a.wav")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(b"\0\0" * 16000 * 3)
+    duration, method = probe_duration(path)
+    assert method == "header"
+    assert duration == pytest.approx(3.0)
+
+
+def test_flac(tmp_path):
+    info = (16000 << 44) | (0 << 41) | (15 << 36) | (16000 * 7)
+    streaminfo = b"\0" * 10 + struct.pack(">Q", info) + b"\0" * 16
+    data = b"fLaC" + b"\x80" + (34).to_bytes(3, "big") + streaminfo + b"\0" * 64
+    duration, method = probe_duration(write(tmp_path, "a.flac", data))
+    assert method == "header"
+    assert duration == pytest.approx(7.0)
+
+
+def test_ogg_opus(tmp_path):
+    first = b"OggS" + b"\0" * 24 + b"OpusHead" + bytes([1, 1]) + struct.pack("<H", 312) + b"\0" * 8
+    last = b"OggS" + b"\0\x04" + struct.pack("<q", 48000 * 10 + 312) + b"\0" * 16
+    duration, method = probe_duration(write(tmp_path, "a.opus", first + b"\0" * 1000 + last))
+    assert method == "header"
+    assert duration == pytest.approx(10.0)
+
+
+def test_mp4(tmp_path):
+    mvhd = box(b"mvhd", b"\0" * 4 + b"\0" * 8 + struct.pack(">II", 1000, 42500) + b"\0" * 80)
+    data = box(b"ftyp", b"M4A \0\0\0\0") + box(b"moov", mvhd) + box(b"mdat", b"\0" * 100)
+    duration, method = probe_duration(write(tmp_path, "a.m4a", data))
+    assert method == "header"
+    assert duration == pytest.approx(42.5)
+
+
+def test_webm(tmp_path):
+    data = b"\x1a\x45\xdf\xa3" + b"\0" * 20 + b"\x44\x89\x88" + struct.pack(">d", 12000.0) + b"\0" * 100
+    duration, method = probe_duration(write(tmp_path, "a.webm", data))
+    assert method == "header"
+    assert duration == pytest.approx(12.0)
+
+
+def test_mp3(tmp_path):
+    # MPEG-1 layer III, 128 kbit/s, 44.1 kHz, no padding: 417-byte frames
+    frame = b"\xff\xfb\x90\x44" + b"\0" * 413
+    data = b"ID3\x03\0\0\0\0\0\x0a" + b"\0" * 10 + frame * 200
+    duration, method = probe_duration(write(tmp_path, "a.mp3", data))
+    assert method == "header"
+    assert duration == pytest.approx(200 * 1152 / 44100, rel=0.01)
+
+
+def test_garbage_falls_through_to_size_estimate(tmp_path):
+    rng = random.Random(1234)
+    for n in range(50):
+        data = bytes(rng.getrandbits(8) for _ in range(200 * 1024))
+        duration, method = probe_duration(write(tmp_path, f"garbage{n}.bin", data))
+        assert method == "size_estimate", f"buffer {n} probed as {duration:.1f}s"
+        assert duration == pytest.approx(len(data) / admission.FALLBACK_BYTES_PER_SECOND)
@@ -0,0 +1,230 @@
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+
+# Runtime thread/process topology for the Whisper services
+# Decides how many inferences may run at once and how many threads each one
+# gets, based on the CPU quota actually granted to the container (cgroups)
+# rather than the host core count, then pins torch, CTranslate2 and ffmpeg
+# to that plan so concurrent requests do not oversubscribe the cores.
+
+logger = logging.getLogger(__name__)
+
+TOPOLOGY_FILE = os.getenv("TOPOLOGY_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "topology.json"))
+
+
+def cgroup_cpu_limit():
+    """Return the CPU quota granted by cgroups (in cores), or None if unlimited"""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+            if quota != "max":
+                return int(quota) / int(period)
+            return None
+    except (OSError, ValueError):
+        pass
+    # cgroup v1
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus():
+    """Return (cpus, source) usable by this process, honouring affinity and cgroup quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+        source = "affinity"
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+        source = "cpu_count"
+    quota = cgroup_cpu_limit()
+    if quota is not None and quota < cpus:
+        # A fractional quota still allows short bursts on one core
+        cpus = max(1, math.floor(quota))
+        source = "cgroup"
+    return cpus, source
+
+
+def _load_tuned(cpus):
+    try:
+        with open(TOPOLOGY_FILE) as f:
+            tuned = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A tuned plan is only valid on a machine with the same CPU budget
+    if tuned.get("cpus") != cpus:
+        logger.info(f"Ignoring {TOPOLOGY_FILE}: tuned for {tuned.get('cpus')} CPUs, running on {cpus}")
+        return None
+    return tuned
+
+
+def plan_topology():
+    """Work out workers and threads per inference for this host.
+
+    Precedence: explicit environment variables, then a plan written by
+    `python topology.py autotune`, then a heuristic based on the CPU quota.
+    """
+    cpus, cpu_source = available_cpus()
+    tuned = _load_tuned(cpus)
+    if tuned:
+        workers = tuned["workers"]
+        threads = tuned["intra_op_threads"]
+        source = "autotune"
+    else:
+        # One inference per four cores keeps each model call reasonably fast
+        # while still letting a bigger box serve concurrent uploads
+        workers = max(1, cpus // 4)
+        threads = max(1, cpus // workers)
+        source = "heuristic"
+
+    if os.getenv("INFERENCE_WORKERS"):
+        workers = int(os.getenv("INFERENCE_WORKERS"))
+        threads = max(1, cpus // workers)
+        source = "env"
+    if os.getenv("INFERENCE_THREADS"):
+        threads = int(os.getenv("INFERENCE_THREADS"))
+        source = "env"
+
+    return {
+        "cpus": cpus,
+        "cpu_source": cpu_source,
+        "cgroup_quota": cgroup_cpu_limit(),
+        "workers": workers,
+        "intra_op_threads": threads,
+        "inter_op_threads": int(os.getenv("INTEROP_THREADS", 1)),
+        "ffmpeg_threads": int(os.getenv("FFMPEG_THREADS", min(2, threads))),
+        "source": source,
+    }
+
+
+def apply_topology(plan):
+    """Pin thread-pool sizes through the environment.
+
+    Must run before torch / CTranslate2 / tokenizers are imported, since
+    OpenMP and MKL read these variables once at load time.
+    """
+    threads = str(plan["intra_op_threads"])
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ[var] = threads
+    # Tokenizer threads on top of concurrent inferences only oversubscribe
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    return plan
+
+
+def configure_torch(plan):
+    """Apply the plan to torch's intra-op and inter-op pools (call once torch is imported)"""
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
+    torch.set_num_threads(plan["intra_op_threads"])
+    try:
+        torch.set_num_interop_threads(plan["inter_op_threads"])
+    except RuntimeError:
+        # Can only be set before the first parallel op has run
+        logger.warning("torch inter-op threads already initialised, leaving as is")
+
+
+def _autotune_candidates(cpus):
+    workers = 1
+    while workers <= cpus:
+        yield workers, max(1, cpus // workers)
+        workers *= 2
+
+
+def _bench_whisper(model_name, audio, workers, threads, repeats):
+    import torch
+    import whisper
+    torch.set_num_threads(threads)
+    model = whisper.load_model(model_name)
+
+    def run():
+        for _ in range(repeats):
+            model.transcribe(audio, fp16=False, language="en", condition_on_previous_text=False)
+
+    return _bench_concurrent(run, workers)
+
+
+def _bench_faster_whisper(model_name, audio, workers, threads, repeats):
+    from faster_whisper import WhisperModel
+    model = WhisperModel(model_name, device="cpu", compute_type="int8", cpu_threads=threads, num_workers=workers)
+
+    def run():
+        for _ in range(repeats):
+            segments, _ = model.transcribe(audio, language="en", beam_size=1)
+            list(segments)
+
+    return _bench_concurrent(run, workers)
+
+
+def _bench_concurrent(run, workers):
+    threads = [threading.Thread(target=run) for _ in range(workers)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.time() - start
+
+
+def autotune(audio_path, model_name="tiny", backend="whisper", seconds=30, repeats=2):
+    """Measure throughput for each worker/thread split and persist the best one"""
+    from process_pipeline import SAMPLE_RATE, load_audio
+
+    cpus, _ = available_cpus()
+    audio = load_audio(audio_path)[: int(seconds * SAMPLE_RATE)]
+    audio_seconds = len(audio) / SAMPLE_RATE
+    bench = _bench_faster_whisper if backend == "faster-whisper" else _bench_whisper
+
+    results = []
+    for workers, threads in _autotune_candidates(cpus):
+        elapsed = bench(model_name, audio, workers, threads, repeats)
+        throughput = audio_seconds * workers * repeats / elapsed
+        print(f"workers={workers} threads={threads}: {throughput:.2f} audio-s/s ({elapsed:.1f}s)")
+        results.append({"workers": workers, "intra_op_threads": threads, "throughput": round(throughput, 3)})
+
+    best = max(results, key=lambda r: r["throughput"])
+    tuned = {
+        "cpus": cpus,
+        "workers": best["workers"],
+        "intra_op_threads": best["intra_op_threads"],
+        "backend": backend,
+        "model": model_name,
+        "results": results,
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(TOPOLOGY_FILE, "w") as f:
+        json.dump(tuned, f, indent=2)
+    print(f"Best: workers={best['workers']} threads={best['intra_op_threads']} -> saved to {TOPOLOGY_FILE}")
+    return tuned
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or auto-tune the inference thread topology")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("show", help="Print the plan for this host (default)")
+    tune = sub.add_parser("autotune", help="Benchmark worker/thread splits and save the fastest")
+    tune.add_argument("--audio", required=True, help="Sample audio file to transcribe")
+    tune.add_argument("--model", default=os.getenv("WHISPER_MODEL", "tiny"))
+    tune.add_argument("--backend", choices=["whisper", "faster-whisper"], default="whisper")
+    tune.add_argument("--seconds", type=float, default=30, help="Seconds of audio per run")
+    tune.add_argument("--repeats", type=int, default=2, help="Runs per worker")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "autotune":
+        autotune(args.audio, args.model, args.backend, args.seconds, args.repeats)
+    else:
+        print(json.dumps(plan_topology(), indent=2))
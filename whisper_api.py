@@ -3,40 +3,127 @@ import os
 # os.environ["PATH"] += os.pathsep + r"C:\Users\T1IN\Downloads\ffmpeg-7.1.1-essentials_build\ffmpeg-7.1.1-essentials_build\bin"
 
 from flask import Flask, request, jsonify
-import whisper
+from topology import apply_topology, configure_torch, plan_topology
+
+# Pin thread pools before torch / transformers are imported
+TOPOLOGY = apply_topology(plan_topology())
+
+import math
 import tempfile
-from transformers import pipeline
+import threading
+import time
 import re
+import hashlib
+import hmac
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from flask_cors import CORS
+from admission import AdmissionRejected, controller_from_env, probe_duration
+from boot import BootState, fast_boot_enabled, warm_up
+from exporters import EXPORT_FORMATS, SegmentCache, Segments, create_notion_page
+from language_id import LanguageIdentifier, session_key, whisper_detector
+from meeting_store import MeetingStore
+from memory_guard import MemoryGuard, MemoryPressure, estimate_job_bytes
+from process_pipeline import CHUNK_SECONDS, SAMPLE_RATE, JobRegistry, Pipeline, ProcessJob, Stage, iter_audio_chunks, load_audio, run_job
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize models as None first, then load them
+# Uploads are admitted by audio duration (see admission.py); this only guards disk space
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_MB", 50)) * 1024 * 1024
+
+# Initialize models as None first, then load them (in the background only with FAST_BOOT=true)
 model = None
-summarizer = None
+model_name = None
+summarization_model = None
 action_item_extractor = None
 
+# Only as many concurrent inferences as the topology plan allows
+inference_slots = threading.BoundedSemaphore(TOPOLOGY["workers"])
+
+# Accept, queue (shortest job first) or reject uploads against the compute budget
+admission = controller_from_env(TOPOLOGY["workers"])
+
+# Free caches and hold back / shed work before the container hits its memory limit
+memory_guard = MemoryGuard().start()
+admission.gates.append(memory_guard.can_start)
+
+# Transcribed segments, kept once in compact form and keyed by the audio's content
+# hash, so every export format is rendered from them without re-transcribing
+segment_cache = SegmentCache(int(os.getenv("SEGMENT_CACHE_SIZE", 64)))
+memory_guard.register_cache("segments", segment_cache.clear)
+
+# Meetings (segments, summary, action items) persisted under their transcript id;
+# segment_cache above stays as the hot copy in front of it
+meeting_store = MeetingStore(
+    os.getenv("MEETING_DB", "meetings.db"),
+    retention_days=float(os.getenv("MEETING_RETENTION_DAYS", 30)),
+    max_meetings=int(os.getenv("MEETING_MAX_COUNT", 1000))
+)
+
+# Meetings are read by their id (the audio content hash); set MEETINGS_TOKEN to
+# also require "Authorization: Bearer <token>" on the /meetings routes
+MEETINGS_TOKEN = os.getenv("MEETINGS_TOKEN", "")
+
+# Language is identified once per upload on its loudest speech window and
+# remembered per session, then fixed for decoding (detector set once Whisper loads)
+language_id = LanguageIdentifier()
+
+# Where Whisper weights are downloaded; point at a persistent disk or a directory baked into the image
+WHISPER_CACHE_DIR = os.getenv("WHISPER_CACHE_DIR") or None
+
 print("Starting Whisper API...")
 
-# Load Whisper model - model size configurable via env, default to base for Render free tier
-try:
-    whisper_model_name = os.getenv("WHISPER_MODEL", "tiny") # Use tiny model for Render free tier to reduce memory usage
-    print(f"Loading Whisper model: {whisper_model_name}...")
-    model = whisper.load_model(whisper_model_name)
-    print("Whisper model loaded successfully!")
-except Exception as e:
-    print(f"Error loading Whisper model '{os.getenv('WHISPER_MODEL', 'base')}': {e}")
-    # Fallback to tiny model if configured model fails
+def load_models(boot):
+    """Import whisper/transformers, load all models and warm up Whisper"""
+    global model, model_name, summarization_model, action_item_extractor
+    
+    # Heavy imports are deferred to here so Flask can serve /health immediately
+    boot.phase = "importing"
+    started = time.time()
+    import whisper
+    from transformers import pipeline
+    boot.mark("imports", started)
+    
+    # Load Whisper model - model size configurable via env, default to base for Render free tier
+    boot.phase = "loading_whisper"
+    started = time.time()
     try:
-        print("Trying tiny model as fallback...")
-        model = whisper.load_model("tiny")
-        print("Tiny Whisper model loaded successfully!")
-    except Exception as e2:
-        print(f"Error loading tiny model: {e2}")
-        model = None
-
-# Load summarization model (optional for memory-constrained environments)
+        whisper_model_name = os.getenv("WHISPER_MODEL", "tiny") # Use tiny model for Render free tier to reduce memory usage
+        print(f"Loading Whisper model: {whisper_model_name}...")
+        model = whisper.load_model(whisper_model_name, download_root=WHISPER_CACHE_DIR)
+        model_name = whisper_model_name
+        print("Whisper model loaded successfully!")
+    except Exception as e:
+        print(f"Error loading Whisper model '{os.getenv('WHISPER_MODEL', 'base')}': {e}")
+        # Fallback to tiny model if configured model fails
+        try:
+            print("Trying tiny model as fallback...")
+            model = whisper.load_model("tiny", download_root=WHISPER_CACHE_DIR)
+            model_name = "tiny"
+            print("Tiny Whisper model loaded successfully!")
+        except Exception as e2:
+            print(f"Error loading tiny model: {e2}")
+            model = None
+    
+    configure_torch(TOPOLOGY)
+    print(f"Inference topology: {TOPOLOGY}")
+    if model is not None:
+        language_id.detect_fn = whisper_detector(model)
+    boot.mark("whisper_load", started)
+    
+    # One dummy inference so the first real request doesn't pay for lazy initialisation
+    if model is not None:
+        boot.phase = "warming_up"
+        started = time.time()
+        with inference_slots:
+            warm_up(lambda audio: model.transcribe(audio, fp16=False, verbose=None, language="en"))
+        boot.mark("warmup", started)
+    
+    boot.phase = "loading_nlp"
+    started = time.time()
+    
+    # Load summarization model (optional for memory-constrained environments)
     try:
         if os.getenv("ENABLE_SUMMARIZATION", "false").lower() == "true":
             print("Loading summarization model...")
@@ -49,14 +136,19 @@ except Exception as e:
         print(f"Warning: Could not load summarization model: {e}")
         print("Continuing without summarization capability...")
         summarization_model = None
+    
+    # Use a small T5 model for extracting action items
+    # This model is not perfect, but will extract tasks in plain English
+    # For more advanced extraction, a custom fine-tuned model would be needed
+    try:
+        action_item_extractor = pipeline("text2text-generation", model="mrm8488/t5-base-finetuned-question-generation-ap")
+    except Exception as e:
+        action_item_extractor = None  # Fallback if model fails to load
+    
+    boot.mark("nlp_load", started)
 
-# Use a small T5 model for extracting action items
-# This model is not perfect, but will extract tasks in plain English
-# For more advanced extraction, a custom fine-tuned model would be needed
-try:
-    action_item_extractor = pipeline("text2text-generation", model="mrm8488/t5-base-finetuned-question-generation-ap")
-except Exception as e:
-    action_item_extractor = None  # Fallback if model fails to load
+boot = BootState("whisper-api")
+boot.start(load_models, background=fast_boot_enabled())
 
 # Notion Integration Setup
 # Replace these with your actual values from Step 1 and Step 4
@@ -72,17 +164,121 @@ try:
 except ImportError:
     print("Notion client not installed. Run: pip install notion-client")
 
+def not_ready_response():
+    response = jsonify({"error": "Models are still loading, please retry shortly.", "boot": boot.to_dict()})
+    response.headers["Retry-After"] = str(boot.retry_after())
+    return response, 503
+
+def admission_rejected_response(error, duration, cost):
+    response = jsonify({
+        "error": str(error),
+        "audio_seconds": round(duration, 1),
+        "estimated_cost_seconds": round(cost, 1),
+        "retry_after": error.retry_after
+    })
+    if error.retry_after:
+        response.headers["Retry-After"] = str(error.retry_after)
+    return response, error.status
+
+def audio_hash(path):
+    """Content hash of an uploaded file, used as its transcript id"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+def meeting_segments(meeting_id):
+    """Segments of a transcript/meeting id: from the hot cache, else the meeting store"""
+    segments = segment_cache.get(meeting_id)
+    if segments is None:
+        segments = meeting_store.load_segments(meeting_id)
+        if segments is not None:
+            segment_cache.put(meeting_id, segments)
+    return segments
+
+def store_meeting(write, *args, **kwargs):
+    """Run a meeting_store write; a failure (disk full, database locked) is logged
+    rather than failing the request, since the result has already been computed"""
+    try:
+        write(*args, **kwargs)
+        return True
+    except (sqlite3.Error, OSError) as e:
+        print(f"Could not save meeting {args[0] if args else ''}: {e}")
+        return False
+
+def transcript_key(path, language_hint):
+    """Transcript id for an upload: its audio hash, suffixed with the requested
+    language when a transcript in another language is already stored under it"""
+    transcript_id = audio_hash(path)
+    if language_hint:
+        # Metadata only: the stored language is all we need, not the transcript
+        try:
+            existing = meeting_store.get(transcript_id)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Could not look up meeting {transcript_id}: {e}")
+            return transcript_id
+        if existing is not None and existing["language"] != language_hint:
+            return f"{transcript_id}-{language_hint}"
+    return transcript_id
+
+def meetings_unauthorized():
+    """401 response when MEETINGS_TOKEN is set and the request doesn't carry it, else None.
+    
+    Every route that reads a stored meeting by id must check this first.
+    """
+    if not MEETINGS_TOKEN:
+        return None
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if hmac.compare_digest(supplied.encode("utf-8"), MEETINGS_TOKEN.encode("utf-8")):
+        return None
+    return jsonify({"error": "Missing or invalid meetings token"}), 401
+
+def request_meeting_id(data):
+    """meeting_id from a request body/query (transcript_id is accepted as an alias)"""
+    return data.get("meeting_id") or data.get("transcript_id")
+
+def estimate_upload_cost(path):
+    """Probe the audio duration from its header and price it with the model's real-time factor"""
+    duration, method = probe_duration(path)
+    cost = admission.estimate_cost(duration, model_name)
+    print(f"Audio duration: {duration:.1f}s ({method}), estimated cost {cost:.1f}s")
+    return duration, cost
+
 @app.route("/health", methods=["GET"])
 def health():
+    # Liveness: answers straight away, even while models are still loading
     return jsonify({
         "status": "ok",
+        "ready": boot.ready,
+        "boot": boot.to_dict(),
         "whisper_model_loaded": model is not None,
-        "summarizer_loaded": summarizer is not None,
-        "action_extractor_loaded": action_item_extractor is not None
+        "summarizer_loaded": summarization_model is not None,
+        "action_extractor_loaded": action_item_extractor is not None,
+        "topology": TOPOLOGY,
+        "admission": admission.stats(),
+        "language_id": language_id.stats(),
+        "meeting_store": meeting_store.stats()
     })
 
+@app.route("/debug/memory", methods=["GET"])
+def debug_memory():
+    # Current/peak memory, limits and the peak RSS (plus top allocation sites
+    # with MEMORY_PROFILER=tracemalloc|torch) of recent requests
+    return jsonify(memory_guard.report())
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    # Readiness: only 200 once models are loaded and warmed up
+    if not boot.ready:
+        return not_ready_response()
+    return jsonify({"status": "ready", "boot": boot.to_dict()})
+
 @app.route("/transcribe", methods=["POST"])
 def transcribe():
+    if not boot.wait_ready():
+        return not_ready_response()
+    
     if model is None:
         return jsonify({"error": "Whisper model not loaded. Please check the server logs."}), 500
     
@@ -91,15 +287,6 @@ def transcribe():
     
     audio_file = request.files["audio"]
     
-    # Check file size - Reduced limit for Render free tier
-    file_size_mb = len(audio_file.read()) / (1024 * 1024)
-    audio_file.seek(0)  # Reset file pointer
-    
-    if file_size_mb > 5:  # Reduced from 10MB to 5MB for Render free tier
-        return jsonify({"error": f"File too large ({file_size_mb:.1f} MB). Maximum size is 5 MB for Render free tier."}), 400
-    
-    print(f"File size: {file_size_mb:.1f} MB")
-    
     # Use original file extension to preserve format
     original_filename = audio_file.filename
     file_extension = os.path.splitext(original_filename)[1] if original_filename else '.wav'
@@ -113,21 +300,60 @@ def transcribe():
         file_size_mb = os.path.getsize(tmp.name) / (1024 * 1024)
         print(f"Processing file: {original_filename} ({file_size_mb:.1f} MB)")
         
-        # Optimized settings for Render free tier
-        print("Starting transcription with optimized settings for Render...")
+        # Language: explicit "language" field, else the session's cached one, else detected
+        session = session_key(request.headers, request.form)
+        language_hint = request.form.get("language")
         
-        # Use conservative settings for Render free tier
-        result = model.transcribe(
-            tmp.name, 
-            fp16=False,  # Disable fp16 for better compatibility
-            verbose=True,
-            condition_on_previous_text=False,  # Disable for memory efficiency
-            compression_ratio_threshold=2.4,   # More lenient threshold
-            logprob_threshold=-1.0,            # More lenient threshold
-            no_speech_threshold=0.6,           # More lenient threshold
-            language=None,                     # Auto-detect language
-            task="transcribe"                  # Explicitly set task
-        )
+        # Same audio already transcribed: answer from the segment cache / meeting store.
+        # A transcript in another language than the one asked for doesn't count; the
+        # requested language is then part of the id so both versions are kept
+        transcript_id = transcript_key(tmp.name, language_hint)
+        cached = meeting_segments(transcript_id)
+        if cached is not None:
+            os.unlink(tmp.name)
+            print(f"Transcript cache hit: {transcript_id}")
+            return jsonify({
+                "text": cached.full_text(),
+                "transcript_id": transcript_id,
+                "meeting_id": transcript_id,
+                "language": cached.language,
+                "cached": True
+            })
+        
+        # Admit by audio duration rather than byte size
+        duration, cost = estimate_upload_cost(tmp.name)
+        try:
+            memory_guard.check(estimate_job_bytes(duration))
+            ticket = admission.submit(cost)
+        except (AdmissionRejected, MemoryPressure) as e:
+            os.unlink(tmp.name)
+            return admission_rejected_response(e, duration, cost)
+        
+        # Waits here for its turn when the instance is busy (shortest job first)
+        with ticket, memory_guard.profile("transcribe"):
+            # Optimized settings for Render free tier
+            print(f"Starting transcription after {ticket.queued_seconds}s in queue...")
+            
+            # Decode with a capped ffmpeg thread count instead of whisper's "-threads 0"
+            audio = load_audio(tmp.name, TOPOLOGY["ffmpeg_threads"])
+            
+            # Use conservative settings for Render free tier
+            started = time.time()
+            with inference_slots:
+                language = language_id.identify(audio, session, language_hint)
+                print(f"Language: {language['language']} ({language['source']}, confidence {language['confidence']})")
+                result = model.transcribe(
+                    audio, 
+                    fp16=False,  # Disable fp16 for better compatibility
+                    verbose=True,
+                    condition_on_previous_text=False,  # Disable for memory efficiency
+                    compression_ratio_threshold=2.4,   # More lenient threshold
+                    logprob_threshold=-1.0,            # More lenient threshold
+                    no_speech_threshold=0.6,           # More lenient threshold
+                    language=language["language"],     # Identified above, so decoding skips detection
+                    task="transcribe"                  # Explicitly set task
+                )
+            admission.rtf.observe(model_name, len(audio) / SAMPLE_RATE, time.time() - started)
         
         # Clean up
         os.unlink(tmp.name)
@@ -135,8 +361,17 @@ def transcribe():
         if not result or not result.get("text"):
             return jsonify({"error": "Transcription returned empty result"}), 500
             
+        segments = Segments.from_whisper(result.get("segments", []), result.get("language"))
+        segment_cache.put(transcript_id, segments)
+        store_meeting(meeting_store.save, transcript_id, segments, title=request.form.get("title"))
         print(f"Transcription successful: {len(result['text'])} characters")
-        return jsonify({"text": result["text"]})
+        return jsonify({
+            "text": result["text"],
+            "transcript_id": transcript_id,
+            "meeting_id": transcript_id,
+            "language": result.get("language"),
+            "language_confidence": language["confidence"]
+        })
         
     except Exception as e:
         print(f"Transcription error: {e}")
@@ -156,12 +391,29 @@ def transcribe():
 def summarize():
     data = request.json
     transcript = data.get('transcript', '')
+    
+    # A stored meeting is summarized once; later calls read the stored result
+    meeting_id = request_meeting_id(data)
+    if meeting_id:
+        unauthorized = meetings_unauthorized()
+        if unauthorized:
+            return unauthorized
+        meeting = meeting_store.get(meeting_id)
+        if meeting is not None and meeting["summary"] and not data.get('refresh'):
+            return jsonify({'summary': meeting["summary"], 'action_items': meeting["action_items"], 'meeting_id': meeting_id})
+        segments = meeting_segments(meeting_id)
+        if segments is None:
+            return jsonify({"error": "Unknown meeting_id"}), 404
+        transcript = segments.full_text()
     print("Received transcript for summarization:", len(transcript), "characters")
     
     if not transcript:
         print("No transcript provided.")
         return jsonify({"error": "No transcript provided"}), 400
     
+    if not boot.wait_ready():
+        return not_ready_response()
+    
     if summarization_model is None:
         return jsonify({"error": "Summarization model not loaded. Please check the server logs."}), 500
     
@@ -170,23 +422,41 @@ def summarize():
         import time
         time.sleep(0.1)
         
-        # Prompt the summarizer for bullet points and decisions
-        prompt = "Summarize the following meeting transcript as bullet points, including key decisions if any:\n" + transcript
-        summary = summarization_model(prompt, max_length=80, min_length=10, do_sample=False)[0]['summary_text']
+        summary = generate_summary(transcript)
         print("Summary generated:", len(summary), "characters")
         
-        if not summary.strip():
-            summary = "No summary could be generated for this transcript."
-            
         action_items = extract_action_items(transcript)
         print("Action items extracted:", len(action_items), "items")
         
+        if meeting_id:
+            store_meeting(meeting_store.update, meeting_id, summary=summary, action_items=action_items)
+            return jsonify({'summary': summary, 'action_items': action_items, 'meeting_id': meeting_id})
         return jsonify({'summary': summary, 'action_items': action_items})
         
     except Exception as e:
         print("Error in summarization:", e)
         return jsonify({"error": str(e)}), 500
 
+def generate_summary(text):
+    # Prompt the summarizer for bullet points and decisions
+    prompt = "Summarize the following meeting transcript as bullet points, including key decisions if any:\n" + text
+    summary = summarization_model(prompt, max_length=80, min_length=10, do_sample=False)[0]['summary_text']
+    if not summary.strip():
+        summary = "No summary could be generated for this transcript."
+    return summary
+
+SUMMARY_FAN_IN = 8  # summaries combined per pass, to stay within the summarizer's input size
+
+def combine_summaries(summaries):
+    # One summary of a long meeting from its per-chunk summaries: summarize them
+    # SUMMARY_FAN_IN at a time until a single one is left
+    while len(summaries) > 1:
+        summaries = [
+            generate_summary("\n".join(summaries[i:i + SUMMARY_FAN_IN]))
+            for i in range(0, len(summaries), SUMMARY_FAN_IN)
+        ]
+    return summaries[0] if summaries else ""
+
 # Extract action items using a prompt-based T5 model
 # Returns a list of action items, including responsible persons and deadlines if present
 # Falls back to rule-based extraction if T5 model is unavailable
@@ -230,6 +500,25 @@ def export_to_notion():
     transcript = data.get('transcript', '')
     summary = data.get('summary', '')
     action_items = data.get('actions', [])
+    title = data.get('title')
+    
+    # Prefer the stored meeting when the client sends its id instead of the text
+    meeting_id = request_meeting_id(data)
+    if meeting_id:
+        unauthorized = meetings_unauthorized()
+        if unauthorized:
+            return unauthorized
+    segments = meeting_segments(meeting_id) if meeting_id else None
+    if segments is not None:
+        meeting = meeting_store.get(meeting_id) or {}
+        summary = summary or meeting.get("summary") or ''
+        action_items = action_items or meeting.get("action_items") or []
+        title = title or meeting.get("title")
+    elif meeting_id and not transcript:
+        return jsonify({"error": "Unknown meeting_id"}), 404
+    else:
+        segments = Segments.from_text(transcript)
+    transcript = transcript or segments.full_text()
     
     print(f"Transcript length: {len(transcript)}")
     print(f"Summary: {summary}")
@@ -241,97 +530,11 @@ def export_to_notion():
     
     try:
         print("Creating Notion page...")
-        # Create blocks for the Notion page
-        children = []
-        
-        # Add summary section
-        if summary:
-            children.extend([
-                {
-                    "object": "block",
-                    "type": "heading_2",
-                    "heading_2": {
-                        "rich_text": [{"type": "text", "text": {"content": "📋 Meeting Summary"}}]
-                    }
-                },
-                {
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {
-                        "rich_text": [{"type": "text", "text": {"content": summary}}]
-                    }
-                }
-            ])
-        
-        # Add action items section
-        if action_items and len(action_items) > 0:
-            children.extend([
-                {
-                    "object": "block",
-                    "type": "heading_2",
-                    "heading_2": {
-                        "rich_text": [{"type": "text", "text": {"content": "✅ Action Items"}}]
-                    }
-                }
-            ])
-            
-            for item in action_items:
-                if item and item.strip():
-                    children.append({
-                        "object": "block",
-                        "type": "to_do",
-                        "to_do": {
-                            "rich_text": [{"type": "text", "text": {"content": item.strip()}}],
-                            "checked": False
-                        }
-                    })
-        
-        # Add full transcript (collapsed)
-        if transcript:
-            children.extend([
-                {
-                    "object": "block",
-                    "type": "heading_2",
-                    "heading_2": {
-                        "rich_text": [{"type": "text", "text": {"content": "📝 Full Transcript"}}]
-                    }
-                },
-                {
-                    "object": "block",
-                    "type": "toggle",
-                    "toggle": {
-                        "rich_text": [{"type": "text", "text": {"content": "Click to expand"}}],
-                        "children": [
-                            {
-                                "object": "block",
-                                "type": "paragraph",
-                                "paragraph": {
-                                    "rich_text": [{"type": "text", "text": {"content": transcript}}]
-                                }
-                            }
-                        ]
-                    }
-                }
-            ])
-        
-        print(f"Creating page with {len(children)} blocks")
         print(f"Database ID: {NOTION_DATABASE_ID}")
         
-        # Create the page in Notion
-        response = notion_client.pages.create(
-            parent={"database_id": NOTION_DATABASE_ID},
-            properties={
-                "Name": {
-                    "title": [
-                        {
-                            "text": {
-                                "content": f"Meeting Notes - {data.get('title', 'Untitled Meeting')}"
-                            }
-                        }
-                    ]
-                }
-            },
-            children=children
+        response = create_notion_page(
+            notion_client, NOTION_DATABASE_ID, title or 'Untitled Meeting',
+            segments, summary, action_items
         )
         
         print("Notion page created successfully:", response["id"])
@@ -348,6 +551,108 @@ def export_to_notion():
         print(f"Full traceback: {traceback.format_exc()}")
         return jsonify({"error": f"Failed to export to Notion: {str(e)}"}), 500
 
+@app.route("/export/<fmt>", methods=["GET", "POST"])
+def export_transcript(fmt):
+    """Stream a transcript as SRT, VTT, Markdown (md), DOCX or JSON"""
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unknown export format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    data = request.get_json(silent=True) or request.args
+    meeting_id = request_meeting_id(data)
+    meeting = {}
+    if meeting_id:
+        unauthorized = meetings_unauthorized()
+        if unauthorized:
+            return unauthorized
+        segments = meeting_segments(meeting_id)
+        if segments is None:
+            return jsonify({"error": "Unknown meeting_id, please transcribe again"}), 404
+        meeting = meeting_store.get(meeting_id) or {}
+    elif data.get('transcript'):
+        segments = Segments.from_text(data['transcript'])
+    else:
+        return jsonify({"error": "No meeting_id or transcript provided"}), 400
+    
+    if fmt in ("srt", "vtt") and not segments.timed:
+        return jsonify({"error": f"{fmt.upper()} export needs timestamps; pass the meeting_id from /transcribe"}), 400
+    
+    mimetype, extension, render = EXPORT_FORMATS[fmt]
+    action_items = data.get('actions') or data.get('action_items') or meeting.get("action_items") or []
+    if isinstance(action_items, str):
+        action_items = [action_items]
+    title = data.get('title') or meeting.get("title") or 'Untitled Meeting'
+    summary = data.get('summary') or meeting.get("summary")
+    return app.response_class(
+        render(segments, title=title, summary=summary, action_items=action_items),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{re.sub(r"[^A-Za-z0-9_-]+", "_", title)}.{extension}"'}
+    )
+
+def page_args(default_limit, max_limit=1000):
+    """offset/limit query parameters, clamped"""
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(max_limit, max(1, int(request.args.get("limit", default_limit))))
+    except ValueError:
+        return None, None
+    return offset, limit
+
+@app.route("/meetings/<meeting_id>", methods=["GET"])
+def get_meeting(meeting_id):
+    """A meeting's title, language, summary and action items (no transcript)"""
+    unauthorized = meetings_unauthorized()
+    if unauthorized:
+        return unauthorized
+    meeting = meeting_store.get(meeting_id)
+    if meeting is None:
+        return jsonify({"error": "Unknown meeting_id"}), 404
+    meeting["transcript_url"] = f"/meetings/{meeting_id}/transcript"
+    return jsonify(meeting)
+
+@app.route("/meetings/<meeting_id>/transcript", methods=["GET"])
+def get_meeting_transcript(meeting_id):
+    """A page of transcript segments (?offset=&limit=); only the blocks it spans are decompressed"""
+    unauthorized = meetings_unauthorized()
+    if unauthorized:
+        return unauthorized
+    meeting = meeting_store.get(meeting_id)
+    if meeting is None:
+        return jsonify({"error": "Unknown meeting_id"}), 404
+    offset, limit = page_args(100)
+    if offset is None:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    segments = [
+        {"start": round(start, 2), "end": round(end, 2), "text": text}
+        for start, end, text in meeting_store.read_segments(meeting_id, offset, limit)
+    ]
+    next_offset = offset + len(segments)
+    return jsonify({
+        "meeting_id": meeting_id,
+        "offset": offset,
+        "limit": limit,
+        "total": meeting["segment_count"],
+        "timed": meeting["timed"],
+        "segments": segments,
+        "next_offset": next_offset if next_offset < meeting["segment_count"] else None
+    })
+
+@app.route("/meetings/<meeting_id>", methods=["PUT"])
+def put_meeting(meeting_id):
+    """Store a transcript computed elsewhere, e.g. chunks merged by coordinator.py:
+    {"segments": [{"start", "end", "text"}, ...], "language", "title"}"""
+    unauthorized = meetings_unauthorized()
+    if unauthorized:
+        return unauthorized
+    data = request.get_json(silent=True) or {}
+    try:
+        segments = Segments.from_whisper(data["segments"], data.get("language"))
+    except (KeyError, TypeError, AttributeError):
+        return jsonify({"error": "segments must be a list of {start, end, text}"}), 400
+    if not store_meeting(meeting_store.save, meeting_id, segments, title=data.get("title")):
+        return jsonify({"error": "Could not store meeting"}), 500
+    segment_cache.put(meeting_id, segments)
+    return jsonify({"meeting_id": meeting_id, "segment_count": len(segments)}), 201
+
 @app.route("/test-notion", methods=["GET"])
 def test_notion():
     print("Testing Notion integration...")
@@ -367,6 +672,177 @@ def test_notion():
         print(f"Notion test error: {e}")
         return jsonify({"error": f"Notion test failed: {str(e)}"}), 500
 
+# Overlapped processing pipeline: decode -> transcribe -> summarize/extract -> export
+# Each stage runs in its own executor, so summarizing chunk N overlaps with
+# transcribing chunk N+1 instead of waiting for three separate round trips.
+process_jobs = JobRegistry()
+memory_guard.register_cache("finished_process_jobs", process_jobs.clear_finished)
+# Jobs wait for an admission ticket inside the executor, so it is sized above the
+# number of slots to let the shortest queued job, not the oldest, go next
+process_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PROCESS_CONCURRENCY", 8)), thread_name_prefix="process")
+
+def run_admitted_job(ticket, job, pipeline, cleanup, audio_seconds):
+    with ticket, memory_guard.profile(f"process {job.id}"):
+        run_job(job, pipeline, cleanup)
+    asr_seconds = pipeline.stages[0].busy_seconds
+    if job.status == "done" and asr_seconds:
+        admission.rtf.observe(model_name, audio_seconds, asr_seconds)
+
+def build_process_pipeline(job, audio_path, export_notion, transcript_id, session=None, language_hint=None, duration=None):
+    state = {"language": None, "language_confidence": 0.0, "segments": [], "summaries": [], "action_items": []}
+    chunk_seconds = int(os.getenv("PROCESS_CHUNK_SECONDS", CHUNK_SECONDS))
+    # Estimated from the probed duration so progress is reported while the job runs
+    if duration:
+        job.chunks_total = max(1, math.ceil(duration / chunk_seconds))
+    
+    def decode():
+        count = 0
+        for chunk in iter_audio_chunks(audio_path, chunk_seconds, TOPOLOGY["ffmpeg_threads"]):
+            count += 1
+            yield chunk
+        job.chunks_total = count
+    
+    def transcribe_chunk(chunk):
+        offset, samples = chunk
+        with inference_slots:
+            # Identify on the first chunk; only retry on later ones while unsure (e.g. a silent intro)
+            if state["language_confidence"] < language_id.threshold:
+                language = language_id.identify(samples, session, language_hint)
+                if language["confidence"] > state["language_confidence"]:
+                    state["language"] = language["language"]
+                    state["language_confidence"] = language["confidence"]
+            result = model.transcribe(
+                samples,
+                fp16=False,
+                verbose=False,
+                condition_on_previous_text=False,
+                compression_ratio_threshold=2.4,
+                logprob_threshold=-1.0,
+                no_speech_threshold=0.6,
+                language=state["language"],
+                task="transcribe"
+            )
+        if state["language"] is None:
+            state["language"] = result.get("language")
+        segments = [
+            {
+                "start": round(offset + seg["start"], 2),
+                "end": round(offset + seg["end"], 2),
+                "text": seg["text"].strip()
+            }
+            for seg in result.get("segments", [])
+        ]
+        return {"text": result.get("text", "").strip(), "segments": segments}
+    
+    def summarize_chunk(item):
+        if item["text"]:
+            if summarization_model is not None:
+                item["summary"] = generate_summary(item["text"])
+            item["action_items"] = [a for a in extract_action_items(item["text"]) if a != "No action items found."]
+        return item
+    
+    def collect(item):
+        state["segments"].extend(item["segments"])
+        if item.get("summary"):
+            state["summaries"].append(item["summary"])
+        state["action_items"].extend(item.get("action_items", []))
+    
+    def export():
+        # Keep the segments once, in compact form, for later /export/<fmt> calls
+        segments = Segments.from_whisper(state["segments"], state["language"])
+        state["segments"].clear()
+        segment_cache.put(transcript_id, segments)
+        summary = combine_summaries(state["summaries"])
+        action_items = state["action_items"] or ["No action items found."]
+        store_meeting(meeting_store.save, transcript_id, segments, title=job.title, summary=summary or None, action_items=action_items)
+        result = {
+            "text": segments.full_text(),
+            "language": state["language"],
+            "language_confidence": state["language_confidence"],
+            "transcript_id": transcript_id,
+            "meeting_id": transcript_id,
+            "summary": summary,
+            "action_items": action_items
+        }
+        if export_notion:
+            if notion_client is None:
+                result["notion"] = {"error": "Notion integration not configured"}
+            else:
+                try:
+                    response = create_notion_page(notion_client, NOTION_DATABASE_ID, job.title, segments, summary, action_items)
+                    result["notion"] = {"page_id": response["id"]}
+                except Exception as e:
+                    print(f"Error exporting to Notion: {e}")
+                    result["notion"] = {"error": f"Failed to export to Notion: {str(e)}"}
+        job.result = result
+    
+    return Pipeline(f"process-{job.id[:8]}", decode, [
+        Stage("transcribe", transcribe_chunk),
+        Stage("summarize", summarize_chunk),
+        Stage("export", collect, finish=export)
+    ])
+
+@app.route("/process", methods=["POST"])
+def process():
+    if not boot.wait_ready():
+        return not_ready_response()
+    
+    if model is None:
+        return jsonify({"error": "Whisper model not loaded. Please check the server logs."}), 500
+    
+    if "audio" not in request.files:
+        return jsonify({"error": "No audio file uploaded"}), 400
+    
+    audio_file = request.files["audio"]
+    title = request.form.get("title") or "Untitled Meeting"
+    export_notion = request.form.get("export", "notion" if notion_client else "none") == "notion"
+    wait = request.form.get("wait", "false").lower() == "true"
+    session = session_key(request.headers, request.form)
+    language_hint = request.form.get("language")
+    
+    original_filename = audio_file.filename
+    file_extension = os.path.splitext(original_filename)[1] if original_filename else '.wav'
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
+    audio_file.save(tmp.name)
+    tmp.close()
+    
+    # Before admission: once a ticket is issued, nothing may fail until the job owns it
+    transcript_id = transcript_key(tmp.name, language_hint)
+    
+    # Admit by audio duration rather than byte size
+    duration, cost = estimate_upload_cost(tmp.name)
+    try:
+        memory_guard.check(estimate_job_bytes(duration))
+        ticket = admission.submit(cost)
+    except (AdmissionRejected, MemoryPressure) as e:
+        os.unlink(tmp.name)
+        return admission_rejected_response(e, duration, cost)
+    
+    def cleanup(job):
+        if os.path.exists(tmp.name):
+            os.unlink(tmp.name)
+    
+    job = ProcessJob(title)
+    process_jobs.add(job)
+    pipeline = build_process_pipeline(job, tmp.name, export_notion, transcript_id, session, language_hint, duration)
+    process_executor.submit(run_admitted_job, ticket, job, pipeline, cleanup, duration)
+    print(f"Process job {job.id} queued for {original_filename}")
+    
+    if wait:
+        job.done.wait()
+        return jsonify(job.to_dict()), 200 if job.status == "done" else 500
+    
+    response = job.to_dict()
+    response["status_url"] = f"/process/{job.id}"
+    return jsonify(response), 202
+
+@app.route("/process/<job_id>", methods=["GET"])
+def process_status(job_id):
+    job = process_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(job.to_dict())
+
 if __name__ == "__main__":
     # Use environment variables for production deployment
     host = os.getenv("HOST", "127.0.0.1")
@@ -1,5 +1,10 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from topology import apply_topology, configure_torch, plan_topology
+
+# Pin thread pools before torch is imported
+TOPOLOGY = apply_topology(plan_topology())
+
 import whisper
 import os
 import tempfile
@@ -24,6 +29,7 @@ def load_models():
         model_name = os.getenv("WHISPER_MODEL", "tiny")
         logger.info(f"Loading Whisper model: {model_name}")
         whisper_model = whisper.load_model(model_name)
+        configure_torch(TOPOLOGY)
         logger.info("Whisper model loaded successfully!")
         return True
     except Exception as e:
@@ -37,7 +43,8 @@ def health_check():
         return jsonify({
             "status": "healthy",
             "whisper_model": "loaded",
-            "message": "Service is running"
+            "message": "Service is running",
+            "topology": TOPOLOGY
         })
     else:
         return jsonify({
@@ -1,18 +1,46 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from topology import apply_topology, configure_torch, plan_topology
+
+# Pin thread pools to the CPU quota before numpy or any model library is imported
+TOPOLOGY = apply_topology(plan_topology())
+
 import os
 import tempfile
 import logging
 import time
 import gc
+import threading
+from admission import AdmissionRejected, controller_from_env, probe_duration
+from boot import BootState, fast_boot_enabled, warm_up
+from language_id import LanguageIdentifier, faster_whisper_detector, session_key, whisper_detector
+from memory_guard import MemoryGuard, MemoryPressure, estimate_job_bytes
+from process_pipeline import SAMPLE_RATE, load_audio
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+logger.info(f"Inference topology: {TOPOLOGY}")
 
 app = Flask(__name__)
 CORS(app)
 
+# Only as many concurrent inferences as the topology plan allows
+inference_slots = threading.BoundedSemaphore(TOPOLOGY["workers"])
+
+# Uploads are admitted by audio duration; the byte cap only guards disk space
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_MB", 50)) * 1024 * 1024
+admission = controller_from_env(TOPOLOGY["workers"])
+
+# Free caches and hold back / shed work before the container hits its memory limit
+memory_guard = MemoryGuard().start()
+admission.gates.append(memory_guard.can_start)
+
+# Language is identified on the loudest 30 s of speech and cached per session;
+# WHISPER_LANGUAGE pins one language for every request instead
+language_id = LanguageIdentifier()
+DEFAULT_LANGUAGE = os.getenv("WHISPER_LANGUAGE") or None
+
 # Global variables for models
 whisper_model = None
 model_type = None
@@ -36,11 +64,12 @@ def load_models():
                 model_name, 
                 device="cpu", 
                 compute_type="int8",
-                cpu_threads=1,
-                num_workers=1,
+                cpu_threads=TOPOLOGY["intra_op_threads"],
+                num_workers=TOPOLOGY["workers"],
                 download_root="/tmp"  # Use temp directory
             )
             model_type = "faster-whisper"
+            language_id.detect_fn = faster_whisper_detector(whisper_model)
             logger.info("Faster-whisper model loaded successfully!")
             return True
             
@@ -51,11 +80,10 @@ def load_models():
             model_name = os.getenv("WHISPER_MODEL", "tiny")
             logger.info(f"Loading regular whisper model: {model_name}")
             
-            # Set environment variables to minimize memory usage
-            os.environ["TOKENIZERS_PARALLELISM"] = "false"
-            
             whisper_model = whisper.load_model(model_name, download_root="/tmp")
+            configure_torch(TOPOLOGY)
             model_type = "regular-whisper"
+            language_id.detect_fn = whisper_detector(whisper_model)
             logger.info("Regular whisper model loaded successfully!")
             return True
             
@@ -65,28 +93,63 @@ def load_models():
         logger.error(f"Error details: {str(e)}")
         return False
 
+def warm_up_model():
+    """Run one dummy inference so the first real request skips lazy initialisation"""
+    def run(audio):
+        if model_type == "faster-whisper":
+            segments, _ = whisper_model.transcribe(audio, language="en", beam_size=1)
+            list(segments)
+        else:
+            whisper_model.transcribe(audio, language="en", fp16=False, verbose=False)
+    
+    with inference_slots:
+        warm_up(run)
+
 # Load models on startup
-def initialize_models():
-    """Load models before first request"""
+def initialize_models(boot):
+    """Load and warm up models before first request"""
     logger.info("Initializing Whisper models...")
+    boot.phase = "loading_whisper"
+    started = time.time()
     if not load_models():
-        logger.error("Failed to load Whisper models!")
-    else:
-        logger.info("Whisper models loaded successfully!")
+        raise RuntimeError("Failed to load Whisper models!")
+    boot.mark("whisper_load", started)
+    
+    boot.phase = "warming_up"
+    started = time.time()
+    warm_up_model()
+    boot.mark("warmup", started)
+    logger.info("Whisper models loaded successfully!")
 
-# Initialize models immediately when app is created
-with app.app_context():
-    initialize_models()
+# Load models before serving; FAST_BOOT=true loads them in the background so /health answers meanwhile
+boot = BootState("whisper-render")
+boot.start(initialize_models, background=fast_boot_enabled())
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    if whisper_model is not None:
+    if boot.ready:
         return jsonify({
             "status": "healthy",
             "whisper_model": "loaded",
             "message": "Service is running",
             "model_type": model_type,
+            "topology": TOPOLOGY,
+            "admission": admission.stats(),
+            "language_id": language_id.stats(),
+            "boot": boot.to_dict(),
+            "endpoints": {
+                "health": "/health",
+                "transcribe": "/transcribe"
+            }
+        })
+    elif boot.error is None:
+        # Still booting: live but not ready, so platform health checks don't kill us
+        return jsonify({
+            "status": "starting",
+            "whisper_model": "loading",
+            "message": "Service is up, models are loading",
+            "boot": boot.to_dict(),
             "endpoints": {
                 "health": "/health",
                 "transcribe": "/transcribe"
@@ -97,15 +160,35 @@ def health_check():
             "status": "unhealthy",
             "whisper_model": "not_loaded",
             "message": "Models not loaded",
+            "boot": boot.to_dict(),
             "endpoints": {
                 "health": "/health",
                 "transcribe": "/transcribe"
             }
         }), 500
 
+@app.route('/debug/memory', methods=['GET'])
+def debug_memory():
+    """Memory report: usage vs limit, cache frees, shed requests and per-request peaks"""
+    return jsonify(memory_guard.report())
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint: 503 until models are loaded and warmed up"""
+    if not boot.ready:
+        response = jsonify({"status": "not_ready", "boot": boot.to_dict()})
+        response.headers["Retry-After"] = str(boot.retry_after())
+        return response, 503
+    return jsonify({"status": "ready", "boot": boot.to_dict()})
+
 @app.route('/transcribe', methods=['POST'])
 def transcribe_audio():
     """Transcribe audio file with memory optimization"""
+    if not boot.wait_ready() and boot.error is None:
+        response = jsonify({"error": "Models are still loading, please retry shortly."})
+        response.headers["Retry-After"] = str(boot.retry_after())
+        return response, 503
+    
     if whisper_model is None:
         return jsonify({"error": "Whisper model not loaded"}), 500
     
@@ -116,54 +199,83 @@ def transcribe_audio():
     if audio_file.filename == '':
         return jsonify({"error": "No audio file selected"}), 400
     
-    # Check file size - strict limit for Render free tier
-    file_size_mb = len(audio_file.read()) / (1024 * 1024)
-    audio_file.seek(0)  # Reset file pointer
-    
-    if file_size_mb > 3:  # 3MB limit for Render free tier
-        return jsonify({"error": f"File too large ({file_size_mb:.1f} MB). Maximum size is 3 MB for Render free tier."}), 400
-    
     try:
         # Save uploaded file temporarily
         with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
             audio_file.save(temp_file.name)
             temp_path = temp_file.name
         
-        # Transcribe using Whisper with memory optimization
-        logger.info("Starting transcription...")
-        start_time = time.time()
+        # Admit by audio duration (probed from the header) rather than byte size
+        duration, method = probe_duration(temp_path)
+        cost_model = f"{model_type}:{os.getenv('WHISPER_MODEL', 'tiny')}"
+        cost = admission.estimate_cost(duration, cost_model)
+        try:
+            memory_guard.check(estimate_job_bytes(duration))
+            ticket = admission.submit(cost)
+        except (AdmissionRejected, MemoryPressure) as e:
+            os.unlink(temp_path)
+            response = jsonify({
+                "error": str(e),
+                "audio_seconds": round(duration, 1),
+                "estimated_cost_seconds": round(cost, 1),
+                "retry_after": e.retry_after
+            })
+            if e.retry_after:
+                response.headers["Retry-After"] = str(e.retry_after)
+            return response, e.status
+        logger.info(f"Admitted {duration:.1f}s of audio ({method}), estimated cost {cost:.1f}s")
         
-        if model_type == "faster-whisper":
-            # Use faster-whisper transcription
-            segments, info = whisper_model.transcribe(
-                temp_path,
-                language="en",
-                beam_size=1,
-                best_of=1,
-                temperature=0.0,
-                compression_ratio_threshold=2.4,
-                log_prob_threshold=-1.0,
-                no_speech_threshold=0.6,
-                condition_on_previous_text=False,
-                initial_prompt=None,
-                word_timestamps=False,
-                prepend_punctuations="\"'([{-",
-                append_punctuations="\"'.!?:;)]}"
-            )
+        session = session_key(request.headers, request.form)
+        language_hint = request.form.get("language") or DEFAULT_LANGUAGE
+        
+        # Waits here for its turn when busy; shortest jobs go first
+        with ticket, memory_guard.profile("transcribe"):
+            # Transcribe using Whisper with memory optimization
+            logger.info("Starting transcription...")
+            start_time = time.time()
+        
+            # Decode with a capped ffmpeg thread count
+            audio = load_audio(temp_path, TOPOLOGY["ffmpeg_threads"])
+        
+            with inference_slots:
+                language = language_id.identify(audio, session, language_hint)
+                logger.info(f"Language: {language['language']} ({language['source']}, confidence {language['confidence']})")
+                detected = language["language"]
+                
+                if model_type == "faster-whisper":
+                    # Use faster-whisper transcription
+                    segments, info = whisper_model.transcribe(
+                        audio,
+                        language=detected,
+                        beam_size=1,
+                        best_of=1,
+                        temperature=0.0,
+                        compression_ratio_threshold=2.4,
+                        log_prob_threshold=-1.0,
+                        no_speech_threshold=0.6,
+                        condition_on_previous_text=False,
+                        initial_prompt=None,
+                        word_timestamps=False,
+                        prepend_punctuations="\"'([{-",
+                        append_punctuations="\"'.!?:;)]}"
+                    )
             
-            # Extract text from segments
-            transcript_text = " ".join([segment.text for segment in segments])
+                    # Extract text from segments
+                    transcript_text = " ".join([segment.text for segment in segments])
+                    detected = detected or info.language
             
-        else:
-            # Use regular whisper transcription
-            result = whisper_model.transcribe(
-                temp_path,
-                language="en",
-                task="transcribe",
-                fp16=False,  # Force FP32 for CPU
-                verbose=False
-            )
-            transcript_text = result["text"]
+                else:
+                    # Use regular whisper transcription
+                    result = whisper_model.transcribe(
+                        audio,
+                        language=detected,
+                        task="transcribe",
+                        fp16=False,  # Force FP32 for CPU
+                        verbose=False
+                    )
+                    transcript_text = result["text"]
+                    detected = detected or result.get("language")
+            admission.rtf.observe(cost_model, len(audio) / SAMPLE_RATE, time.time() - start_time)
         
         # Clean up temporary file
         try:
@@ -176,7 +288,8 @@ def transcribe_audio():
         
         return jsonify({
             "text": transcript_text,
-            "language": "en",
+            "language": detected,
+            "language_confidence": language["confidence"],
             "processing_time": f"{transcription_time:.2f}s",
             "model_type": model_type
         })
@@ -211,11 +324,10 @@ def index():
     })
 
 if __name__ == "__main__":
-    # Load models immediately when running directly
+    # Models are loaded (or, with FAST_BOOT=true, loading) by the boot above
     logger.info("Starting Whisper API...")
-    if load_models():
-        logger.info("Starting Whisper API on 127.0.0.1:5001")
-        app.run(host="127.0.0.1", port=5001, debug=False)
-    else:
+    if not fast_boot_enabled() and not boot.ready:
         logger.error("Failed to load models. Cannot start service.")
-        exit(1) 
\ No newline at end of file
+        exit(1)
+    logger.info("Starting Whisper API on 127.0.0.1:5001")
+    app.run(host="127.0.0.1", port=5001, debug=False) 
\ No newline at end of file